@@ -0,0 +1,120 @@
+"""Benchmark mapping "legacy" vs "slim" (dimensione indici, throughput di indicizzazione).
+
+Indicizza lo stesso campione di documenti intermedi in indici temporanei
+(<indice>_bench_<schema>) creati con es_setup.index_bodies(schema), poi misura
+tempo di bulk, doc/s e dimensione su disco dopo un force merge a 1 segmento.
+Gli embeddings sono disattivati (i campi vettoriali sono identici nei due schemi)
+e il contesto usa solo l'overlap lessicale, per non dipendere dagli indici reali.
+
+Esempio:
+    python -m src.bench.bench_mapping --max-docs 300
+"""
+
+import argparse
+import json
+import time
+
+from elasticsearch import Elasticsearch
+
+from ..config import ES_HOST, LOG_DIR, INTERMEDIATE_DIR
+from ..indexing.bulk import bulk_index
+from ..indexing.es_setup import index_bodies
+from ..indexing.index_papers import paper_actions
+from ..indexing.index_tables_figures import object_actions
+
+SCHEMES = ("legacy", "slim")
+
+
+def load_sample(max_docs: int) -> list[dict]:
+    docs = []
+    for path in sorted(INTERMEDIATE_DIR.glob("*.json"))[:max_docs]:
+        try:
+            docs.append(json.loads(path.read_text(encoding="utf-8")))
+        except json.JSONDecodeError:
+            continue
+    return docs
+
+
+def sample_actions(es: Elasticsearch, docs: list[dict], names: dict) -> list[dict]:
+    local_vecs = {kind: ([], []) for kind in ("paper", "paragraph", "table", "figure")}
+    actions = []
+    for doc in docs:
+        actions += paper_actions(doc, False, local_vecs)
+        actions += object_actions(es, doc, False, {"overlap"}, local_vecs)
+    for a in actions:
+        a["_index"] = names[a["_index"]]
+    return actions
+
+
+def run_scheme(es: Elasticsearch, scheme: str, docs: list[dict], keep: bool) -> dict:
+    bodies = index_bodies(scheme)
+    names = {base: f"{base}_bench_{scheme}" for base in bodies}
+    for base, body in bodies.items():
+        if es.indices.exists(index=names[base]):
+            es.indices.delete(index=names[base])
+        es.indices.create(index=names[base], body=body)
+
+    actions = sample_actions(es, docs, names)
+    t0 = time.perf_counter()
+    report = bulk_index(es, actions, dead_letter=None)
+    es.indices.refresh(index=list(names.values()))
+    seconds = time.perf_counter() - t0
+
+    es.indices.forcemerge(index=list(names.values()), max_num_segments=1, request_timeout=600)
+    stats = es.indices.stats(index=list(names.values()), metric=["store", "docs"])["indices"]
+
+    per_index = {}
+    for base, name in names.items():
+        prim = stats.get(name, {}).get("primaries", {})
+        per_index[base] = {
+            "docs": prim.get("docs", {}).get("count", 0),
+            "bytes": prim.get("store", {}).get("size_in_bytes", 0),
+        }
+    if not keep:
+        es.indices.delete(index=list(names.values()))
+
+    total_bytes = sum(v["bytes"] for v in per_index.values())
+    return {
+        "actions": len(actions),
+        "failed": len(report.failed),
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(len(actions) / seconds, 1) if seconds else None,
+        "bytes": total_bytes,
+        "indices": per_index,
+    }
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="legacy vs slim mapping benchmark")
+    ap.add_argument("--max-docs", type=int, default=300, help="Documenti intermedi nel campione")
+    ap.add_argument("--schemes", nargs="+", choices=SCHEMES, default=list(SCHEMES))
+    ap.add_argument("--keep", action="store_true", help="Non cancellare gli indici di benchmark")
+    args = ap.parse_args(argv)
+
+    es = Elasticsearch(ES_HOST, request_timeout=120)
+    docs = load_sample(args.max_docs)
+    if not docs:
+        print(f"[ERR] Nessun documento intermedio in {INTERMEDIATE_DIR}")
+        return
+    print(f"[INFO] campione={len(docs)} documenti intermedi")
+
+    results = {scheme: run_scheme(es, scheme, docs, args.keep) for scheme in args.schemes}
+
+    print(f"{'scheme':<8} | {'actions':<8} | {'sec':<8} | {'doc/s':<8} | {'MB':<8}")
+    print("-" * 52)
+    for scheme, r in results.items():
+        print(f"{scheme:<8} | {r['actions']:<8} | {r['seconds']:<8.2f} | {r['docs_per_sec'] or 0:<8.1f} | "
+              f"{r['bytes'] / 1e6:<8.2f}")
+        for base, v in r["indices"].items():
+            print(f"  {base:<16} docs={v['docs']:<7} MB={v['bytes'] / 1e6:.2f}")
+    if "legacy" in results and "slim" in results and results["legacy"]["bytes"]:
+        ratio = results["slim"]["bytes"] / results["legacy"]["bytes"]
+        print(f"[INFO] slim/legacy dimensione = {ratio:.2f}")
+
+    out = LOG_DIR / "bench_mapping.json"
+    out.write_text(json.dumps({"sample_docs": len(docs), "results": results}, indent=2), encoding="utf-8")
+    print(f"[DONE] Risultati salvati in {out}")
+
+
+if __name__ == "__main__":
+    main()
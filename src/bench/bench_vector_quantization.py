@@ -0,0 +1,143 @@
+"""Benchmark float32 vs int8 vector storage (recall@k, memoria, latenza).
+
+Misura il percorso reale di ricerca: per ogni variante costruisce un LocalVectorIndex
+(quantization "float32" | "int8") in una directory temporanea e cronometra search(),
+con recall@k rispetto al top-k esatto in float32.
+
+Usa i paragrafi dei JSON intermedi come corpus e i titoli dei paper come query
+(stesso scenario di hw5_paragraphs). Senza modello di embedding disponibile si
+puo' usare --synthetic per un corpus di vettori casuali normalizzati.
+
+Esempio:
+    python -m src.bench.bench_vector_quantization --max-paragraphs 20000 --k 10
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ..config import INTERMEDIATE_DIR, LOG_DIR, EMBEDDING_DIMS
+from ..embeddings import embed_array, INT8_SCALE
+from ..vector_index import LocalVectorIndex
+
+VARIANTS = ("float32", "int8")
+
+
+def load_corpus(max_paragraphs: int, max_queries: int):
+    paragraphs, titles = [], []
+    for path in sorted(INTERMEDIATE_DIR.glob("*.json")):
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            continue
+        if doc.get("title") and len(titles) < max_queries:
+            titles.append(doc["title"])
+        for p in doc.get("paragraphs", []):
+            if len(p) >= 20:
+                paragraphs.append(p)
+        if len(paragraphs) >= max_paragraphs and len(titles) >= max_queries:
+            break
+    return paragraphs[:max_paragraphs], titles
+
+
+def synthetic_corpus(n: int, nq: int, dims: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    docs = rng.standard_normal((n, dims)).astype(np.float32)
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    # query = documento perturbato, cosi' i vicini non sono casuali
+    base = docs[rng.integers(0, n, size=nq)]
+    queries = base + 0.5 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(dims)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs, queries.astype(np.float32)
+
+
+def topk(matrix, qvec, k: int):
+    scores = matrix @ qvec
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def build_store(root: Path, docs, quantization: str, chunk: int = 10000) -> LocalVectorIndex:
+    store = LocalVectorIndex("bench", root=root, dims=docs.shape[1], quantization=quantization)
+    for start in range(0, docs.shape[0], chunk):
+        rows = docs[start:start + chunk]
+        store.upsert([str(i) for i in range(start, start + rows.shape[0])], rows)
+    return store
+
+
+def run(docs, queries, k: int, repeats: int):
+    results = {}
+    truth = [set(topk(docs, q, k).tolist()) for q in queries]
+
+    for name in VARIANTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = build_store(Path(tmp), docs, name)
+            store.search(queries[0], k)  # apertura del memmap fuori dalla misura
+            latencies = []
+            recalls = []
+            for qi, q in enumerate(queries):
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    hits = store.search(q, k)
+                latencies.append((time.perf_counter() - t0) / repeats)
+                recalls.append(len(truth[qi] & {int(doc_id) for doc_id, _ in hits}) / len(truth[qi]))
+            size = store.vec_path.stat().st_size
+
+        results[name] = {
+            f"recall@{k}": round(statistics.mean(recalls), 4),
+            "bytes": int(size),
+            "bytes_per_vector": int(size // max(1, docs.shape[0])),
+            "latency_ms_p50": round(statistics.median(latencies) * 1000, 3),
+            "latency_ms_max": round(max(latencies) * 1000, 3),
+        }
+    results["int8"]["scale"] = INT8_SCALE
+    return results
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="float32 vs int8 vector storage benchmark")
+    ap.add_argument("--max-paragraphs", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--repeats", type=int, default=3, help="Ripetizioni per query (latenza)")
+    ap.add_argument("--synthetic", action="store_true", help="Vettori casuali, nessun modello richiesto")
+    args = ap.parse_args(argv)
+
+    if args.synthetic:
+        docs, queries = synthetic_corpus(args.max_paragraphs, args.queries, EMBEDDING_DIMS)
+    else:
+        paragraphs, titles = load_corpus(args.max_paragraphs, args.queries)
+        docs = embed_array(paragraphs) if paragraphs else None
+        queries = embed_array(titles) if titles else None
+        if docs is None or queries is None:
+            print("[ERR] Embeddings non disponibili (EMBEDDINGS_ENABLED / sentence-transformers): usa --synthetic")
+            return
+
+    print(f"[INFO] corpus={docs.shape[0]} vettori x {docs.shape[1]} dims, query={len(queries)}, k={args.k}")
+    results = run(docs, queries, args.k, args.repeats)
+
+    print(f"{'variant':<8} | {'recall@' + str(args.k):<10} | {'MB':<8} | {'p50 ms':<8} | {'max ms':<8}")
+    print("-" * 54)
+    for name, r in results.items():
+        print(f"{name:<8} | {r[f'recall@{args.k}']:<10.4f} | {r['bytes'] / 1e6:<8.2f} | "
+              f"{r['latency_ms_p50']:<8.3f} | {r['latency_ms_max']:<8.3f}")
+
+    out = LOG_DIR / "bench_vector_quantization.json"
+    out.write_text(json.dumps({
+        "corpus": int(docs.shape[0]),
+        "dims": int(docs.shape[1]),
+        "queries": int(len(queries)),
+        "synthetic": args.synthetic,
+        "results": results,
+    }, indent=2), encoding="utf-8")
+    print(f"[DONE] Risultati salvati in {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from pathlib import Path
 import re
 ES_HOST = "http://localhost:9200"
+# Connessioni per nodo del client AsyncElasticsearch condiviso (src/search/search_async.py)
+ASYNC_ES_CONNECTIONS = 10
 
 # =======================
 # Search / IR improvements
@@ -8,22 +10,81 @@ ES_HOST = "http://localhost:9200"
 
 # Analyzer name used in ES mappings
 TEXT_ANALYZER = "hw5_en"
+# "slim": shingle solo nei subfield .shingles di title/abstract/caption, index_phrases,
+#         best_compression, niente doc_values/norms dove non servono
+# "legacy": shingle 2-3 su tutti i campi di testo (mapping originale)
+MAPPING_SCHEME = "slim"
 
 # Cross-index fusion (papers/tables/figures)
 RRF_K = 60  # Reciprocal Rank Fusion constant
+# "rrf" | "max_norm" | "weighted_rrf" | "weighted_max_norm"
+CROSS_FUSION = "rrf"
+# Ricerca a tier: prima i campi corti senza fuzziness, poi (solo se i risultati sono meno di
+# topk) tutti i campi + fuzziness. Vale per le query full-text con operator "and".
+# Off di default: se il tier 1 si riempie, i doc che matchano solo in full_text restano fuori
+# dal ranking anche quando batterebbero i match deboli sui campi corti; da riattivare solo dopo
+# un confronto di recall sulle qrels (src/eval_noLLM).
+TIERED_SEARCH = False
+TIER1_SKIP_FIELDS = ("full_text", "mentions", "context_paragraphs")  # i campi costosi da valutare
+# Fuzziness adattiva: ricerca esatta; solo sotto FUZZY_MIN_HITS risultati si riprova con la
+# correzione del term suggester e poi con fuzziness "AUTO" (se il chiamante la chiede).
+# Off di default (cambia i risultati di CLI/UI rispetto alla fuzziness fissa): da attivare dopo
+# un confronto prima/dopo sulle qrels
+ADAPTIVE_FUZZINESS = False
+FUZZY_MIN_HITS = 3
+# Budget di latenza (ms) di search_index/cross_search: timeout lato server e terminate_after per
+# ogni sotto-ricerca, i round successivi (tier/fuzzy) solo se resta budget. None = nessun budget.
+SEARCH_BUDGET_MS = None
+BUDGET_TERMINATE_AFTER = 10000  # doc raccolti al massimo per shard sotto budget
+BUDGET_CLIENT_GRACE = 1.0       # secondi oltre il budget prima che il client abbandoni la richiesta
+# Facet (facets=True): aggregazioni source / authors.keyword / anno nella stessa richiesta della
+# ricerca, con la shard request cache di ES
+FACET_SIZE = 10
+# grouped_search: gruppi candidati del collapse (ordinati da ES per BM25 grezzo) poi riordinati
+# per rank fuso per tipo; ogni gruppo costa una ricerca inner_hits
+GROUPED_CANDIDATES = 50
+FUSION_WEIGHTS = {"paper": 1.0, "table": 1.0, "figure": 1.0}  # solo varianti weighted_*
+
+# Result cache (src/search/result_cache.py)
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_MAX_ENTRIES = 1024     # tier LRU in-process
+SEARCH_CACHE_TTL = 300              # secondi
+SEARCH_CACHE_DISK = False           # tier SQLite condiviso tra processi (data/cache/)
+SEARCH_CACHE_GENERATION_CHECK = 5   # secondi tra due controlli uuid/_meta.cache_generation degli indici
+PAPER_TITLE_CACHE_SIZE = 4096       # titoli dei paper per le card di tabelle/figure
+PAPER_TITLE_CACHE_TTL = 3600
+
+# Bulk indexing (src/indexing/bulk.py)
+BULK_CHUNK_SIZE = 500
+BULK_MAX_RETRIES = 5                # tentativi per 429/5xx/errori di connessione (chunk dimezzato ogni volta)
+BULK_INITIAL_BACKOFF = 2            # secondi, raddoppia a ogni tentativo
+BULK_MAX_BACKOFF = 60
+CHECKPOINT_EVERY_FILES = 50         # file intermedi per commit (bulk + manifest + checkpoint)
 
 # Default query parser
 # - False: use robust multi_match (recommended)
 # - True:  use query_string to allow boolean operators and advanced syntax
 USE_QUERY_STRING_BY_DEFAULT = False
+# LRU delle query compilate (search_core.compile_query)
+QUERY_COMPILE_CACHE_SIZE = 1024
 
 # Context extraction for tables/figures
 # - "mlt"     : Elasticsearch more_like_this over paragraph index
 # - "overlap" : lexical overlap between table/figure terms and paragraphs
 # - "hybrid"  : union of both (deduplicated)
+# - "embedding": cosine top-k from one batched inference per paper (needs EMBEDDINGS_ENABLED)
+# Metodi combinabili con "+", es. "mlt+embedding".
 CONTEXT_METHOD = "hybrid"
 OVERLAP_THRESHOLD = 0.30
 CONTEXT_TOP_K = 8
+EMBEDDING_CONTEXT_MIN_SIM = 0.35
+# Paragrafi piu' corti non vengono indicizzati in hw5_paragraphs
+MIN_PARAGRAPH_CHARS = 20
+# Campi di ricerca compatti di tabelle/figure (il paragrafo intero resta solo in hw5_paragraphs):
+# mentions = finestra di caratteri per lato attorno a ogni mention, context_paragraphs = frasi
+# di ogni paragrafo di contesto piu' vicine alla caption, fino a CONTEXT_WINDOW_CHARS
+MENTION_WINDOW_CHARS = 200
+CONTEXT_WINDOW_CHARS = 400
 
 # Embeddings / vector search (optional)
 EMBEDDINGS_ENABLED = False
@@ -31,8 +92,21 @@ EMBEDDINGS_ENABLED = False
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DIMS = 384
 
+# Vector storage precision (ES dense_vector + local vector store)
+# - "float32": 4 byte/dim, index_options "hnsw"
+# - "int8"   : 1 byte/dim, index_options "int8_hnsw" (scalar quantization)
+# Usa src.bench.bench_vector_quantization per confrontare recall/memoria/latenza.
+VECTOR_QUANTIZATION = "float32"
+
 # Rerank (optional). If enabled and embeddings enabled, we can re-score top N docs.
 HYBRID_RERANK_TOP_N = 50
+HYBRID_RERANK_ENABLED = False
+HYBRID_ALPHA = 0.5  # peso del coseno (0 = solo BM25, 1 = solo vettori)
+
+# Local NumPy vector index (src/vector_index.py): coseni per il rerank ibrido senza round trip ES
+LOCAL_VECTOR_INDEX_ENABLED = True   # gli indexer aggiornano lo store locale se ci sono vettori
+VECTOR_BLOCK_ROWS = 65536           # righe per blocco nel top-k brute-force
+VECTOR_COMPACT_DEAD_RATIO = 0.25    # index_all compatta lo store oltre questa quota di righe cancellate
 
 # Temporal filters defaults (UI/CLI can override)
 DEFAULT_DATE_FROM = None  
@@ -45,6 +119,11 @@ PMC_HTML_DIR = DATA / "pmc_html"
 RAW_JSON_DIR = DATA / "raw_json"
 INTERMEDIATE_DIR = DATA / "intermediate_json"
 LOG_DIR = DATA / "logs"
+VECTOR_INDEX_DIR = DATA / "vectors"
+SEARCH_CACHE_PATH = DATA / "cache" / "search_cache.sqlite"
+INDEX_MANIFEST_PATH = DATA / "cache" / "index_manifest.json"   # indicizzazione delta (content hash)
+BULK_DEAD_LETTER_PATH = LOG_DIR / "bulk_dead_letter.jsonl"        # azioni bulk fallite (replay con src.indexing.bulk)
+INDEX_CHECKPOINT_PATH = DATA / "cache" / "index_checkpoint.json"   # file gia' confermati (index_all --resume)
 
 ARXIV_HTML_DIR.mkdir(parents=True, exist_ok=True)
 PMC_HTML_DIR.mkdir(parents=True, exist_ok=True)
@@ -97,4 +176,16 @@ INDEX_PAPERS = "hw5_papers"
 INDEX_PARAGRAPHS = "hw5_paragraphs"
 INDEX_TABLES = "hw5_tables"
 INDEX_FIGURES = "hw5_figures"
+# Un indice fisico per sorgente (<indice>_<sorgente>, es. hw5_papers_arxiv) e i nomi qui sopra
+# come alias unione: SearchFilters.source sceglie direttamente l'indice e ogni sorgente si
+# ricostruisce da sola (es_setup --recreate --source pmc). Sorgenti non elencate -> "unk".
+# Opt-in: un'installazione esistente passa al nuovo layout con es_setup --recreate + index_all --full
+SPLIT_INDICES_BY_SOURCE = False
+INDEX_SOURCES = ("arxiv", "pmc", "unk")
+# Routing per paper: i paragrafi sono sempre indicizzati con routing=paper_id (MLT e lookup
+# per paper su un solo shard); con True anche tabelle e figure (richiede es_setup --recreate)
+ROUTE_OBJECTS_BY_PAPER = False
+# Index sorting per data (desc) su papers/tables/figures: le ricerche sort="recency" terminano
+# presto invece di ordinare tutti i match (richiede es_setup --recreate)
+INDEX_SORT_BY_DATE = False
 EMBEDDINGS_ENABLED = False
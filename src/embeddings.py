@@ -12,6 +12,10 @@ from typing import List, Optional
 
 from .config import EMBEDDINGS_ENABLED, EMBEDDING_MODEL_NAME
 
+# Normalized embeddings have components in [-1, 1], so a fixed symmetric scale
+# maps them onto the int8 range without per-vector calibration.
+INT8_SCALE = 127.0
+
 
 @lru_cache(maxsize=1)
 def _load_model():
@@ -31,11 +35,41 @@ def available() -> bool:
     return _load_model() is not None
 
 
-def embed(texts: List[str]) -> Optional[List[List[float]]]:
-    """Return embeddings as python lists, or None if unavailable."""
+def embed_array(texts: List[str], batch_size: int = 64):
+    """Return a float32 (n, dims) numpy matrix of normalized embeddings, or None."""
     model = _load_model()
     if model is None:
         return None
-    vecs = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    import numpy as np
+
+    vecs = model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(vecs, dtype=np.float32)
+
+
+def embed(texts: List[str]) -> Optional[List[List[float]]]:
+    """Return embeddings as python lists, or None if unavailable."""
+    vecs = embed_array(texts)
+    if vecs is None:
+        return None
     # numpy -> list
     return [v.tolist() for v in vecs]
+
+
+def quantize_int8(vecs):
+    """Scalar-quantize normalized float vectors to int8 (same idea as ES int8_hnsw)."""
+    import numpy as np
+
+    q = np.rint(np.asarray(vecs, dtype=np.float32) * INT8_SCALE)
+    return np.clip(q, -127, 127).astype(np.int8)
+
+
+def dequantize_int8(qvecs):
+    """Inverse of quantize_int8 (approximate)."""
+    import numpy as np
+
+    return np.asarray(qvecs, dtype=np.float32) / INT8_SCALE
@@ -5,7 +5,7 @@ import os
 import time
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
-from src.search.search_core import cross_search
+from src.search.search_core import cross_search, ID_SOURCE_FIELDS
 
 from elasticsearch import Elasticsearch
 from openai import OpenAI
@@ -21,6 +21,13 @@ MODEL_JUDGE = "llama-3.1-8b-instant"
 TOP_N_POOL = int(os.getenv("EVAL_TOP_N_POOL", "50"))
 MAX_BODY_CHARS = int(os.getenv("EVAL_MAX_BODY_CHARS", "1400"))
 
+# _source minimo per il giudice: id + testo passato all'LLM
+JUDGE_SOURCE_FIELDS = {
+    "paper": ID_SOURCE_FIELDS["paper"] + ["title", "abstract"],
+    "table": ID_SOURCE_FIELDS["table"] + ["caption", "body"],
+    "figure": ID_SOURCE_FIELDS["figure"] + ["caption"],
+}
+
 def get_openai_client() -> OpenAI:
     api_key = os.getenv("GROQ_API_KEY", "GROQ_API_KEY")
     base_url = "https://api.groq.com/openai/v1"
@@ -53,7 +60,8 @@ def retrieve_pool(es, query, top_n=50):
         es,
         query,
         size_each=20,      # candidati per indice
-        size_total=top_n   # totale finale dopo fusione
+        size_total=top_n,  # totale finale dopo fusione
+        source_fields=JUDGE_SOURCE_FIELDS,
     )
 
     pool = []
@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Dict, List
 
 from elasticsearch import Elasticsearch
-from src.search.search_core import cross_search
+from src.search.search_core import cross_search, ID_SOURCE_FIELDS
 from src.config import ES_HOST, INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES
 
 QUERIES_PATH = Path("data/eval/queries_llm.jsonl")
@@ -118,7 +118,8 @@ def main():
             es,
             qtext,
             size_each=20,
-            size_total=TOP_K
+            size_total=TOP_K,
+            source_fields=ID_SOURCE_FIELDS,
         )
 
         ranked = []
@@ -8,6 +8,7 @@ from elasticsearch import Elasticsearch
 
 # --- CONFIGURAZIONE ---
 from src.config import ES_HOST, INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES
+from src.search.search_core import fetch_paragraphs, search_index, ID_SOURCE_FIELDS
 
 QUERIES_PATH = Path("data/eval_noLLM/queries_noLLM.jsonl")
 OUT_QRELS = Path("data/eval_noLLM/qrels_noLLM.tsv")
@@ -15,6 +16,13 @@ OUT_QRELS = Path("data/eval_noLLM/qrels_noLLM.tsv")
 TOP_N_POOL = 10  # Ridotto per velocità, puoi aumentarlo a 20 o 50
 MAX_BODY_CHARS = 1400
 
+# _source minimo per il giudice (id + testo valutato da judge_relevance)
+JUDGE_SOURCE_FIELDS = {
+    "paper": ID_SOURCE_FIELDS["paper"] + ["title", "abstract"],
+    "table": ID_SOURCE_FIELDS["table"] + ["caption", "body"],
+    "figure": ID_SOURCE_FIELDS["figure"] + ["caption", "context_refs"],
+}
+
 def es_client() -> Elasticsearch:
     return Elasticsearch(ES_HOST)
 
@@ -34,22 +42,27 @@ def build_doc_id(doc_type: str, src: Dict[str, Any]) -> str:
 
 def retrieve_pool(es: Elasticsearch, target: str, query: str, n: int) -> List[Tuple[str, Dict[str, Any]]]:
     out = []
-    def search(index: str, fields: List[str]) -> List[Dict[str, Any]]:
+    def search(index: str, fields: List[str], doc_type: str) -> List[Dict[str, Any]]:
         try:
-            body = {"size": n, "query": {"multi_match": {"query": query, "fields": fields}}}
-            return es.search(index=index, body=body)["hits"]["hits"]
+            # multi_match semplice (operator or, senza fuzziness) come baseline
+            res = search_index(
+                es, index, query, fields, topk=n,
+                source_includes=JUDGE_SOURCE_FIELDS[doc_type],
+                mode="fulltext", operator="or", fuzziness=None,
+            )
+            return res["hits"]["hits"]
         except Exception as e:
             print(f"Errore ricerca ES su {index}: {e}")
             return []
 
     if target in ("papers", "cross"):
-        hits = search(INDEX_PAPERS, ["title^2", "abstract", "full_text"])
+        hits = search(INDEX_PAPERS, ["title^2", "abstract", "full_text"], "paper")
         out += [("paper", h["_source"]) for h in hits]
     if target in ("tables", "cross"):
-        hits = search(INDEX_TABLES, ["caption^2", "body", "mentions", "context_paragraphs"])
+        hits = search(INDEX_TABLES, ["caption^2", "body", "mentions", "context_paragraphs"], "table")
         out += [("table", h["_source"]) for h in hits]
     if target in ("figures", "cross"):
-        hits = search(INDEX_FIGURES, ["caption^2", "mentions", "context_paragraphs"])
+        hits = search(INDEX_FIGURES, ["caption^2", "mentions", "context_paragraphs"], "figure")
         out += [("figure", h["_source"]) for h in hits]
 
     seen = set()
@@ -59,7 +72,21 @@ def retrieve_pool(es: Elasticsearch, target: str, query: str, n: int) -> List[Tu
         if did in seen: continue
         seen.add(did)
         uniq.append((dt, src))
-    return uniq[:n]
+    uniq = uniq[:n]
+
+    # Il testo dei paragrafi di contesto delle figure non e' in _source:
+    # un solo mget per tutto il pool.
+    ref_ids = [r.get("id") for dt, src in uniq if dt == "figure" for r in (src.get("context_refs") or [])]
+    if ref_ids:
+        try:
+            texts = fetch_paragraphs(es, ref_ids)
+        except Exception as e:
+            print(f"Errore mget paragrafi: {e}")
+            texts = {}
+        for dt, src in uniq:
+            if dt == "figure":
+                src["context_paragraphs"] = [texts.get(r.get("id"), "") for r in (src.get("context_refs") or [])]
+    return uniq
 
 def heuristic_judge(qtext: str, content: str) -> Tuple[int, str]:
     """
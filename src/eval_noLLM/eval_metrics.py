@@ -10,6 +10,7 @@ from typing import Dict, List
 from elasticsearch import Elasticsearch
 
 from src.config import ES_HOST, INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES
+from src.search.search_core import search_index, ID_SOURCE_FIELDS
 
 QUERIES_PATH = Path("data/eval_noLLM/queries_noLLM.jsonl")
 QRELS_PATH = Path("data/eval_noLLM/qrels_noLLM.tsv")
@@ -68,8 +69,12 @@ def success_at_k(ranked: List[str], relevant: set, k: int) -> float:
 
 def build_ranked_list(es: Elasticsearch, target: str, query: str, k: int) -> List[str]:
     def search(index: str, fields: List[str], doc_type: str) -> List[str]:
-        body = {"size": k, "query": {"multi_match": {"query": query, "fields": fields}}}
-        hits = es.search(index=index, body=body)["hits"]["hits"]
+        res = search_index(
+            es, index, query, fields, topk=k,
+            source_includes=ID_SOURCE_FIELDS[doc_type],
+            mode="fulltext", operator="or", fuzziness=None,
+        )
+        hits = res["hits"]["hits"]
         ranked = []
         for h in hits:
             s = h["_source"]
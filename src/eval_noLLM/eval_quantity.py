@@ -1,7 +1,7 @@
 import time
 import statistics
 from typing import List, Dict, Tuple
-from ..search.search_core import es_client, cross_search, SearchFilters
+from ..search.search_core import es_client, cross_search, SearchFilters, ID_SOURCE_FIELDS
 
 # --- GROUND TRUTH AGGIORNATO ---
 # NOTA: Se ottieni ancora 0.00, controlla l'output di DEBUG nel terminale
@@ -93,7 +93,7 @@ def run_evaluation():
         start_time = time.perf_counter()
         
         # Eseguiamo la ricerca Cross-Search (RRF)
-        results = cross_search(es, query, size_total=10)
+        results = cross_search(es, query, size_total=10, source_fields=ID_SOURCE_FIELDS, fusion="rrf")
         
         latency = time.perf_counter() - start_time
         
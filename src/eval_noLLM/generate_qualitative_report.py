@@ -1,5 +1,5 @@
 import os
-from ..search.search_core import es_client, cross_search
+from ..search.search_core import es_client, cross_search, fetch_paragraphs
 
 # 1. Definiamo i casi studio qualitativi
 # Ogni query è scelta per dimostrare una capacità specifica del sistema
@@ -35,12 +35,20 @@ def generate_report():
             f.write(f"**Obiettivo:** {item['reason']}\n\n")
 
             # Eseguiamo la ricerca reale
-            results = cross_search(es, item['query'], size_total=3)
+            results = cross_search(es, item['query'], size_total=3, fusion="rrf")
 
             if not results:
                 f.write("> ⚠️ Nessun risultato trovato per questa configurazione.\n\n")
                 continue
 
+            # Contesto (per tabelle/figure): i doc salvano solo i riferimenti; mostriamo solo il
+            # primo paragrafo per brevità, con un solo mget per tutti i risultati della query
+            first_ids = [
+                ((hit['_source'].get('context_refs') or [{}])[0]).get('id')
+                for _, _, hit in results
+            ]
+            contexts = fetch_paragraphs(es, [i for i in first_ids if i])
+
             for rank, (kind, score, hit) in enumerate(results, start=1):
                 source = hit['_source']
                 title = source.get('title') or source.get('caption') or "Senza Titolo"
@@ -57,11 +65,12 @@ def generate_report():
                             f.write(f"  - *{field}*: ...{s}...\n")
                 
                 # Estrazione Contesto (Per tabelle/figure)
-                if 'context_paragraphs' in source and source['context_paragraphs']:
-                    f.write("- **Contesto (Punto 19):**\n")
-                    # Mostriamo solo il primo paragrafo di contesto per brevità
-                    context = source['context_paragraphs'][0][:200]
-                    f.write(f"  - 📖 *\"{context}...\"*\n")
+                first_id = first_ids[rank - 1]
+                if first_id:
+                    context = contexts.get(first_id, "")[:200]
+                    if context:
+                        f.write("- **Contesto (Punto 19):**\n")
+                        f.write(f"  - 📖 *\"{context}...\"*\n")
                 
                 f.write("\n")
             f.write("---\n\n")
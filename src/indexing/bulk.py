@@ -0,0 +1,164 @@
+"""
+Bulk indexing tollerante ai fallimenti.
+
+- streaming_bulk per chunk con raise_on_error=False: gli errori si raccolgono per azione;
+- 429 / 5xx transitori / errori di connessione: retry con backoff esponenziale e chunk dimezzati;
+- errori permanenti (mapping, 4xx): in un dead-letter JSONL (config.BULK_DEAD_LETTER_PATH),
+  rieseguibile con:
+
+    python -m src.indexing.bulk --replay
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from elasticsearch import Elasticsearch, helpers
+from elasticsearch.exceptions import ConnectionError as ESConnectionError, ConnectionTimeout
+
+from ..config import (
+    ES_HOST,
+    BULK_CHUNK_SIZE,
+    BULK_MAX_RETRIES,
+    BULK_INITIAL_BACKOFF,
+    BULK_MAX_BACKOFF,
+    BULK_DEAD_LETTER_PATH,
+)
+from ..search.result_cache import bump_generation
+
+# None = errore di trasporto (connessione/timeout), nessuno status HTTP
+TRANSIENT_STATUS = {None, 429, 502, 503, 504}
+
+
+@dataclass
+class BulkReport:
+    ok: int = 0
+    retried: int = 0
+    failed: List[Dict[str, Any]] = field(default_factory=list)  # azioni finite nel dead-letter
+
+    def failed_keys(self) -> set:
+        return {(a.get("_index"), a.get("_id")) for a in self.failed}
+
+
+def _error_info(item: Dict[str, Any]) -> tuple:
+    info = next(iter(item.values()), {}) if item else {}
+    status = info.get("status")
+    return (status if isinstance(status, int) else None), info.get("error")
+
+
+def bulk_index(
+    es: Elasticsearch,
+    actions: Iterable[Dict[str, Any]],
+    chunk_size: int = BULK_CHUNK_SIZE,
+    max_retries: int = BULK_MAX_RETRIES,
+    ignore_status: tuple = (),
+    dead_letter: Optional[Path] = BULK_DEAD_LETTER_PATH,
+    request_timeout: int = 120,
+) -> BulkReport:
+    """
+    Invia `actions` (anche un generatore) a chunk di chunk_size senza mai interrompere
+    il caricamento: ritorna un BulkReport con conteggi e azioni fallite in modo permanente.
+    """
+    report = BulkReport()
+
+    def dead(action, status, error):
+        report.failed.append(action)
+        if dead_letter is None:
+            return
+        dead_letter.parent.mkdir(parents=True, exist_ok=True)
+        with dead_letter.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "ts": time.time(),
+                "status": status,
+                "error": error,
+                "action": action,
+            }, ensure_ascii=False, default=str) + "\n")
+
+    def send(chunk: List[Dict[str, Any]], attempt: int = 0):
+        retry = []
+        done = 0
+        try:
+            results = helpers.streaming_bulk(
+                es,
+                chunk,
+                chunk_size=len(chunk),
+                max_retries=0,  # retry gestiti qui, con chunk piu' piccoli
+                raise_on_error=False,
+                raise_on_exception=False,
+                request_timeout=request_timeout,
+            )
+            for action, (ok, item) in zip(chunk, results):
+                done += 1
+                status, error = _error_info(item)
+                if ok or status in ignore_status:
+                    report.ok += 1
+                elif status in TRANSIENT_STATUS and attempt < max_retries:
+                    retry.append(action)
+                else:
+                    dead(action, status, error)
+        except (ESConnectionError, ConnectionTimeout) as e:
+            # il resto del chunk non ha ricevuto risposta
+            for action in chunk[done:]:
+                if attempt < max_retries:
+                    retry.append(action)
+                else:
+                    dead(action, None, repr(e))
+
+        if retry:
+            report.retried += len(retry)
+            wait = min(BULK_INITIAL_BACKOFF * (2 ** attempt), BULK_MAX_BACKOFF)
+            print(f"[BULK] {len(retry)} azioni da ritentare (tentativo {attempt + 1}/{max_retries}) tra {wait}s")
+            time.sleep(wait)
+            half = max(1, len(chunk) // 2)
+            for start in range(0, len(retry), half):
+                send(retry[start:start + half], attempt + 1)
+
+    batch: List[Dict[str, Any]] = []
+    for action in actions:
+        batch.append(action)
+        if len(batch) >= chunk_size:
+            send(batch)
+            batch = []
+    if batch:
+        send(batch)
+
+    if report.failed:
+        print(f"[BULK] {len(report.failed)} azioni fallite salvate in {dead_letter}")
+    return report
+
+
+def replay_dead_letter(es: Elasticsearch, path: Path = BULK_DEAD_LETTER_PATH) -> BulkReport:
+    """Reinvia le azioni del dead-letter; quelle che falliscono ancora vi vengono riscritte."""
+    if not path.exists():
+        return BulkReport()
+    replaying = path.with_suffix(".replaying")
+    path.replace(replaying)
+    actions = [json.loads(line)["action"] for line in replaying.read_text(encoding="utf-8").splitlines() if line.strip()]
+    report = bulk_index(es, actions, dead_letter=path)
+    replaying.unlink()
+    if report.ok:
+        # doc reinviati visibili, poi nuova generazione per la cache dei risultati
+        indices = sorted({a["_index"] for a in actions})
+        es.indices.refresh(index=indices)
+        bump_generation(es, indices)
+    return report
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Bulk dead-letter replay")
+    ap.add_argument("--replay", nargs="?", const=str(BULK_DEAD_LETTER_PATH), metavar="PATH",
+                    help="Reinvia le azioni fallite (default: config.BULK_DEAD_LETTER_PATH)")
+    args = ap.parse_args(argv)
+    if not args.replay:
+        ap.print_help()
+        return
+
+    es = Elasticsearch(ES_HOST, request_timeout=120)
+    report = replay_dead_letter(es, Path(args.replay))
+    print(f"[DONE] replay: ok={report.ok}, ritentate={report.retried}, ancora fallite={len(report.failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,14 @@ from ..config import (
     TEXT_ANALYZER,
     EMBEDDINGS_ENABLED,
     EMBEDDING_DIMS,
+    VECTOR_QUANTIZATION,
+    ROUTE_OBJECTS_BY_PAPER,
+    MAPPING_SCHEME,
+    INDEX_SORT_BY_DATE,
+    SPLIT_INDICES_BY_SOURCE,
+    INDEX_SOURCES,
 )
+from ..utils import physical_index, physical_indices
 
 
 def create_or_replace_index(es: Elasticsearch, name: str, body: dict, recreate: bool = False):
@@ -22,8 +29,81 @@ def create_or_replace_index(es: Elasticsearch, name: str, body: dict, recreate:
     es.indices.create(index=name, body=body)
 
 
-def common_settings() -> dict:
-    return {
+def add_fields(es: Elasticsearch, name: str, body: dict, fields: tuple = ("kind",)):
+    """Campi nuovi e solo additivi (es. kind) su un indice gia' esistente, senza --recreate."""
+    props = body["mappings"].get("properties", {})
+    new = {f: props[f] for f in fields if f in props}
+    if new and es.indices.exists(index=name):
+        es.indices.put_mapping(index=name, properties=new)
+
+
+def ensure_alias(es: Elasticsearch, base: str, recreate: bool = False):
+    """Alias unione `base` sugli indici fisici per sorgente esistenti."""
+    if es.indices.exists(index=base) and not es.indices.exists_alias(name=base):
+        # indice unico del layout senza split, con lo stesso nome dell'alias: senza alias gli
+        # indexer scriverebbero negli indici fisici e le ricerche resterebbero sul vecchio indice
+        if not recreate:
+            raise SystemExit(f"[ERR] {base} e' ancora un indice unico: rilancia es_setup con --recreate "
+                             "per passare agli indici per sorgente (oppure SPLIT_INDICES_BY_SOURCE = False)")
+        es.indices.delete(index=base)
+    targets = [i for i in physical_indices(base) if es.indices.exists(index=i)]
+    if targets:
+        es.indices.update_aliases(actions=[{"add": {"index": i, "alias": base}} for i in targets])
+
+
+def missing_layout(es: Elasticsearch, bases: list[str]) -> list[str]:
+    """Indici fisici o alias mancanti per `bases` (vuota senza SPLIT_INDICES_BY_SOURCE)."""
+    if not SPLIT_INDICES_BY_SOURCE:
+        return []
+    missing = [i for base in bases for i in physical_indices(base) if not es.indices.exists(index=i)]
+    return missing + [f"alias {base}" for base in bases if not es.indices.exists_alias(name=base)]
+
+
+def unrouted(es: Elasticsearch, bases: list[str]) -> list[str]:
+    """
+    Indici fisici esistenti di `bases` creati senza _routing.required: i loro doc sono
+    instradati per _id e MLT/mget con routing=paper_id non li trovano (serve --recreate).
+    """
+    out = []
+    for name in (i for base in bases for i in physical_indices(base)):
+        if not es.indices.exists(index=name):
+            continue
+        for info in es.indices.get_mapping(index=name).values():
+            if not (info.get("mappings", {}).get("_routing") or {}).get("required"):
+                out.append(name)
+    return out
+
+
+SHINGLE_ANALYZER = f"{TEXT_ANALYZER}_shingles"
+# solo minuscole, niente stemming/stop: le forme superficiali per il term suggester (.raw)
+RAW_ANALYZER = f"{TEXT_ANALYZER}_raw"
+
+
+def common_settings(scheme: str = MAPPING_SCHEME) -> dict:
+    """
+    scheme "legacy": shingle 2-3 nell'analyzer di tutti i campi di testo.
+    scheme "slim": analyzer base senza shingle (le shingle solo nei subfield .shingles di
+    title/abstract/caption) e codec best_compression.
+    """
+    base_filters = ["lowercase", "asciifolding", "english_stop", "english_stemmer"]
+    analyzers = {
+        SHINGLE_ANALYZER: {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": base_filters + ["hw5_shingle"],
+        },
+        TEXT_ANALYZER: {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": base_filters + (["hw5_shingle"] if scheme == "legacy" else []),
+        },
+        RAW_ANALYZER: {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase"],
+        },
+    }
+    settings = {
         "analysis": {
             "filter": {
                 "english_stop": {
@@ -41,24 +121,29 @@ def common_settings() -> dict:
                     "output_unigrams": True
                 },
             },
-            "analyzer": {
-                TEXT_ANALYZER: {
-                    "type": "custom",
-                    "tokenizer": "standard",
-                    "filter": [
-                        "lowercase",
-                        "asciifolding",
-                        "english_stop",
-                        "english_stemmer",
-                        "hw5_shingle"
-                    ],
-                }
-            },
+            "analyzer": analyzers,
         }
     }
+    if scheme == "slim":
+        settings["codec"] = "best_compression"
+    return settings
 
 
 
+def date_sorted(settings: dict) -> dict:
+    """Settings con index sorting su date desc (INDEX_SORT_BY_DATE), per le query sort="recency"."""
+    if not INDEX_SORT_BY_DATE:
+        return settings
+    return {
+        **settings,
+        "index": {
+            "sort.field": "date",
+            "sort.order": "desc",
+            "sort.missing": "_last",
+        },
+    }
+
+
 def field_text() -> dict:
     return {"type": "text", "analyzer": TEXT_ANALYZER}
 
@@ -71,40 +156,119 @@ def field_text_with_keyword() -> dict:
     }
 
 
+def field_shingled_text(keyword: bool = False, prefixes: bool = False) -> dict:
+    """
+    Testo corto e molto pesato (title/abstract/caption): unigrammi nel campo, shingle 2-3
+    nel subfield .shingles (boost per termini adiacenti), index_phrases per le "frasi"
+    del compilatore booleano, index_prefixes opzionale per query prefisso/autocomplete.
+    """
+    field = {"type": "text", "analyzer": TEXT_ANALYZER, "index_phrases": True}
+    if prefixes:
+        field["index_prefixes"] = {"min_chars": 2, "max_chars": 5}
+    field["fields"] = {"shingles": {"type": "text", "analyzer": SHINGLE_ANALYZER}}
+    if keyword:
+        field["fields"]["keyword"] = {"type": "keyword", "ignore_above": 256}
+    return field
+
+
+def field_bulk_text() -> dict:
+    """Testo lungo/multi-valore usato solo per il matching (mentions, context): niente norms."""
+    return {"type": "text", "analyzer": TEXT_ANALYZER, "norms": False}
+
+
+def field_stored_keyword() -> dict:
+    """Keyword solo restituita nel _source (url, id secondari): non indicizzata, niente doc_values."""
+    return {"type": "keyword", "index": False, "doc_values": False}
+
+
+def field_date() -> dict:
+    return {"type": "date", "format": "strict_date_optional_time||yyyy-MM-dd||yyyy"}
+
+
+def field_authors() -> dict:
+    return {
+        "type": "text",
+        "analyzer": TEXT_ANALYZER,
+        "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+    }
+
+
+def parent_paper_fields(scheme: str = MAPPING_SCHEME) -> dict:
+    """Metadati del paper padre copiati in tables/figures (niente lookup a query time)."""
+    return {
+        "paper_title": field_text_with_keyword() if scheme == "legacy" else field_shingled_text(keyword=True),
+        "authors": field_authors(),
+        "date": field_date(),
+    }
+
+
 def maybe_vector() -> dict:
     if not EMBEDDINGS_ENABLED:
         return {}
-    # ES supports dense_vector. kNN syntax depends on ES version; we keep mapping portable.
-    return {"type": "dense_vector", "dims": EMBEDDING_DIMS, "index": False}
+    # int8_hnsw (ES >= 8.12): il grafo HNSW tiene in memoria vettori quantizzati a int8
+    # (~4x meno heap/page cache); il float32 originale resta su disco per il rescoring.
+    index_type = "int8_hnsw" if VECTOR_QUANTIZATION == "int8" else "hnsw"
+    return {
+        "type": "dense_vector",
+        "dims": EMBEDDING_DIMS,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {"type": index_type},
+    }
 
 
-def main(argv: list[str] | None = None):
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--recreate", action="store_true", help="Drop and recreate indices")
-    args = ap.parse_args(argv)
+def vector_field(name: str) -> dict:
+    """Proprieta' di mapping per un campo vettoriale ({} se embeddings disabilitati)."""
+    vec = maybe_vector()
+    return {name: vec} if vec else {}
 
-    es = Elasticsearch(ES_HOST)
 
-    settings = common_settings()
+def index_bodies(scheme: str = MAPPING_SCHEME) -> dict:
+    """{nome indice: body di create} per lo schema di mapping richiesto ("slim" | "legacy")."""
+    if scheme not in ("slim", "legacy"):
+        raise ValueError(f"MAPPING_SCHEME sconosciuto: {scheme}")
+    slim = scheme == "slim"
+
+    settings = common_settings(scheme)
+    # routing=paper_id obbligatorio: una get/mget senza routing fallisce invece di cercare sullo shard sbagliato
+    routed = {"_routing": {"required": True}}
+    objects_routing = routed if ROUTE_OBJECTS_BY_PAPER else {}
+
+    # fingerprint del _source per l'indicizzazione delta (solo memorizzato)
+    content_hash = field_stored_keyword()
+    stored = field_stored_keyword() if slim else {"type": "keyword", "index": False}
+    # slim: campi di soli metadati mappati esplicitamente invece che dal dynamic mapping (text + keyword)
+    extra_stored = {"doc_url": field_stored_keyword(), "original_id": field_stored_keyword()} if slim else {}
+    def short_text(keyword: bool = False, prefixes: bool = False, raw: bool = False) -> dict:
+        if slim:
+            field = field_shingled_text(keyword, prefixes)
+        else:
+            field = field_text_with_keyword() if keyword else field_text()
+        if raw:
+            # subfield non stemmato: "did you mean" propone parole scritte cosi' nei documenti
+            field.setdefault("fields", {})["raw"] = {"type": "text", "analyzer": RAW_ANALYZER}
+        return field
+
+    bulk_text = field_bulk_text if slim else field_text
+    object_id = {"type": "keyword", "doc_values": False} if slim else {"type": "keyword"}
 
     papers_body = {
-        "settings": settings,
+        "settings": date_sorted(settings),
         "mappings": {
             "properties": {
                 "paper_id": {"type": "keyword"},
+                "kind": {"type": "keyword"},  # paper|table|figure: collapse dei gruppi per paper
+                "content_hash": content_hash,
                 "source": {"type": "keyword"},
-                "url": {"type": "keyword", "index": False},
-                "title": field_text_with_keyword(),
-                "authors": {
-                    "type": "text",
-                    "analyzer": TEXT_ANALYZER,
-                    "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
-                },
-                "date": {"type": "date", "format": "strict_date_optional_time||yyyy-MM-dd||yyyy"},
-                "abstract": field_text(),
+                "url": stored,
+                **extra_stored,
+                "title": short_text(keyword=True, prefixes=True, raw=True),
+                "authors": field_authors(),
+                "date": field_date(),
+                "abstract": short_text(),
                 "full_text": field_text(),
                 # Optional: semantic search vectors (use with hybrid retrieval)
-                #"title_abstract_vec": maybe_vector(),
+                **vector_field("title_abstract_vec"),
             }
         },
     }
@@ -112,57 +276,110 @@ def main(argv: list[str] | None = None):
     paragraphs_body = {
         "settings": settings,
         "mappings": {
+            **routed,
             "properties": {
                 "paper_id": {"type": "keyword"},
-                "para_id": {"type": "integer"},
+                "content_hash": content_hash,
+                "para_id": {"type": "integer", "doc_values": False} if slim else {"type": "integer"},
+                **({"source": {"type": "keyword", "doc_values": False}} if slim else {}),
                 "text": field_text(),
+                **vector_field("text_vec"),
             }
         },
     }
 
+    # mentions/context_paragraphs: finestre compatte attorno a mention/contesto (non il paragrafo
+    # intero, gia' indicizzato in hw5_paragraphs), solo indicizzate per il matching; in _source
+    # restano i riferimenti *_refs ai doc di hw5_paragraphs.
+    paragraph_refs = {"type": "object", "enabled": False}
+
     tables_body = {
-        "settings": settings,
+        "settings": date_sorted(settings),
         "mappings": {
+            **objects_routing,
+            "_source": {"excludes": ["mentions", "context_paragraphs"]},
             "properties": {
                 "paper_id": {"type": "keyword"},
-                "table_id": {"type": "keyword"},
-                "caption": field_text_with_keyword(),
+                "kind": {"type": "keyword"},  # paper|table|figure: collapse dei gruppi per paper
+                "content_hash": content_hash,
+                "table_id": object_id,
+                "caption": short_text(keyword=True, raw=True),
                 "body": field_text(),
                 "table_html": {"type": "keyword", "index": False, "doc_values": False},
-                "mentions": field_text(),
-                "context_paragraphs": field_text(),
+                "mentions": bulk_text(),
+                "context_paragraphs": bulk_text(),
+                "mention_refs": paragraph_refs,
+                "context_refs": paragraph_refs,
                 "context_meta": {"type": "object", "enabled": True},
-                "url": {"type": "keyword", "index": False},
+                "url": stored,
+                **extra_stored,
                 "source": {"type": "keyword"},
-                #"caption_body_vec": maybe_vector(),
+                **parent_paper_fields(scheme),
+                **vector_field("caption_vec"),
             }
         },
     }
 
     figures_body = {
-        "settings": settings,
+        "settings": date_sorted(settings),
         "mappings": {
+            **objects_routing,
+            "_source": {"excludes": ["mentions", "context_paragraphs"]},
             "properties": {
                 "paper_id": {"type": "keyword"},
-                "figure_id": {"type": "keyword"},
-                "caption": field_text_with_keyword(),
-                "figure_url": {"type": "keyword", "index": False},
-                "mentions": field_text(),
-                "context_paragraphs": field_text(),
+                "kind": {"type": "keyword"},  # paper|table|figure: collapse dei gruppi per paper
+                "content_hash": content_hash,
+                "figure_id": object_id,
+                "caption": short_text(keyword=True, raw=True),
+                "figure_url": stored,
+                "mentions": bulk_text(),
+                "context_paragraphs": bulk_text(),
+                "mention_refs": paragraph_refs,
+                "context_refs": paragraph_refs,
                 "context_meta": {"type": "object", "enabled": True},
-                "url": {"type": "keyword", "index": False},
+                "url": stored,
+                **extra_stored,
                 "source": {"type": "keyword"},
-                #"caption_vec": maybe_vector(),
+                **parent_paper_fields(scheme),
+                **vector_field("caption_vec"),
             }
         },
     }
 
-    create_or_replace_index(es, INDEX_PAPERS, papers_body, recreate=args.recreate)
-    create_or_replace_index(es, INDEX_PARAGRAPHS, paragraphs_body, recreate=args.recreate)
-    create_or_replace_index(es, INDEX_TABLES, tables_body, recreate=args.recreate)
-    create_or_replace_index(es, INDEX_FIGURES, figures_body, recreate=args.recreate)
+    return {
+        INDEX_PAPERS: papers_body,
+        INDEX_PARAGRAPHS: paragraphs_body,
+        INDEX_TABLES: tables_body,
+        INDEX_FIGURES: figures_body,
+    }
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--recreate", action="store_true", help="Drop and recreate indices")
+    ap.add_argument("--scheme", choices=["slim", "legacy"], default=MAPPING_SCHEME,
+                    help="Schema di mapping (default config.MAPPING_SCHEME)")
+    ap.add_argument("--source", choices=INDEX_SOURCES,
+                    help="Solo gli indici fisici di questa sorgente (con --recreate: ricostruisce solo quella)")
+    args = ap.parse_args(argv)
+    if args.source and not SPLIT_INDICES_BY_SOURCE:
+        ap.error("--source richiede config.SPLIT_INDICES_BY_SOURCE")
+
+    es = Elasticsearch(ES_HOST)
+
+    bodies = index_bodies(args.scheme)
+    sources = [args.source] if args.source else list(INDEX_SOURCES)
+    for name, body in bodies.items():
+        if not SPLIT_INDICES_BY_SOURCE:
+            create_or_replace_index(es, name, body, recreate=args.recreate)
+            add_fields(es, name, body)
+            continue
+        for source in sources:
+            create_or_replace_index(es, physical_index(name, source), body, recreate=args.recreate)
+            add_fields(es, physical_index(name, source), body)
+        ensure_alias(es, name, recreate=args.recreate)
 
-    print("[OK] Indici pronti:", INDEX_PAPERS, INDEX_PARAGRAPHS, INDEX_TABLES, INDEX_FIGURES)
+    print(f"[OK] Indici pronti ({args.scheme}):", ", ".join(bodies))
 
 
 if __name__ == "__main__":
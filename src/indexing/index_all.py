@@ -0,0 +1,279 @@
+"""
+Indicizzazione single-pass di papers, paragrafi, tabelle e figure.
+
+Ogni JSON intermedio viene letto e decodificato una sola volta:
+- fase 1: paper + paragrafi in un unico stream bulk (senza MLT anche tabelle/figure);
+- barriera: un solo refresh esplicito di hw5_paragraphs;
+- fase 2: tabelle/figure, il cui contesto MLT interroga i paragrafi appena indicizzati.
+
+Indicizzazione delta (manifest.IndexManifest): i file invariati non vengono nemmeno
+decodificati, dei file cambiati si inviano solo i doc con content_hash diverso e si
+cancellano i doc spariti. --full reinvia tutto.
+
+Con SPLIT_INDICES_BY_SOURCE le azioni vanno all'indice fisico della sorgente del documento
+(hw5_papers_arxiv, ...), non all'alias.
+
+I file vengono inviati a gruppi (CHECKPOINT_EVERY_FILES): dopo ogni gruppo confermato da ES
+manifest, store vettoriale e checkpoint sono su disco, e --resume riprende un run
+interrotto (anche nella fase MLT) dal gruppo successivo.
+
+Esempio:
+    python -m src.indexing.index_all
+    python -m src.indexing.index_all --phase objects   # solo tabelle/figure
+    python -m src.indexing.index_all --full
+    python -m src.indexing.index_all --full --resume
+"""
+import argparse
+import json
+from collections import Counter
+from itertools import chain
+
+from elasticsearch import Elasticsearch
+
+from ..config import (
+    ES_HOST,
+    INDEX_PAPERS,
+    INDEX_PARAGRAPHS,
+    INDEX_TABLES,
+    INDEX_FIGURES,
+    INTERMEDIATE_DIR,
+    EMBEDDINGS_ENABLED,
+    LOCAL_VECTOR_INDEX_ENABLED,
+    VECTOR_COMPACT_DEAD_RATIO,
+    CHECKPOINT_EVERY_FILES,
+    ROUTE_OBJECTS_BY_PAPER,
+)
+from ..embeddings import available as embeddings_available
+from ..search.result_cache import bump_generation
+from ..utils import timed, physical_index, physical_indices
+from .bulk import bulk_index
+from .es_setup import missing_layout, unrouted
+from .index_papers import paper_actions, paper_doc_id
+from .index_tables_figures import context_methods, object_actions
+from .manifest import IndexManifest, Checkpoint, content_hash, file_hash
+
+PHASES = ("all", "papers", "objects")
+PAPER_INDICES = [INDEX_PAPERS, INDEX_PARAGRAPHS]
+OBJECT_INDICES = [INDEX_TABLES, INDEX_FIGURES]
+INDEX_KIND = {INDEX_PAPERS: "paper", INDEX_PARAGRAPHS: "paragraph", INDEX_TABLES: "table", INDEX_FIGURES: "figure"}
+# indici con routing=paper_id (anche le delete devono indicarlo)
+ROUTED_INDICES = {INDEX_PARAGRAPHS} | ({INDEX_TABLES, INDEX_FIGURES} if ROUTE_OBJECTS_BY_PAPER else set())
+
+
+def delete_action(index: str, doc_id: str, routing: str, target: str = "") -> dict:
+    """Delete di un doc dell'indice logico `index`, inviata all'indice fisico `target`."""
+    action = {"_op_type": "delete", "_index": target or index, "_id": doc_id}
+    if index in ROUTED_INDICES and routing:
+        action["_routing"] = routing
+    return action
+
+
+def load_changed(manifest: IndexManifest, indices: list[str], full: bool) -> tuple[list, list[str]]:
+    """
+    (nome file, hash, doc) dei file intermedi nuovi o cambiati per `indices`
+    (tutti con full) e nomi dei file spariti rispetto al manifest.
+    """
+    changed = []
+    present = set()
+    for path in sorted(INTERMEDIATE_DIR.glob("*.json")):
+        data = path.read_bytes()
+        fhash = file_hash(data)
+        present.add(path.name)
+        if not full and manifest.unchanged(path.name, fhash, indices):
+            continue
+        try:
+            changed.append((path.name, fhash, json.loads(data.decode("utf-8"))))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"[ERR] JSON corrotto: {path.name}")
+    gone = [name for name in manifest.files if name not in present]
+    return changed, gone
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Indicizza papers, paragrafi, tabelle e figure in un solo passaggio")
+    ap.add_argument("--phase", choices=PHASES, default="all",
+                    help="papers = paper+paragrafi, objects = tabelle+figure (paragrafi gia' indicizzati)")
+    ap.add_argument("--full", action="store_true", help="Reinvia tutti i doc ignorando i content hash")
+    ap.add_argument("--resume", action="store_true", help="Riprende un run interrotto saltando i file gia' confermati")
+    args = ap.parse_args(argv)
+
+    es = Elasticsearch(ES_HOST, request_timeout=120, max_retries=5, retry_on_timeout=True)
+    use_vec = EMBEDDINGS_ENABLED and embeddings_available()
+    methods = context_methods()
+    if "embedding" in methods and not use_vec:
+        print("[WARN] CONTEXT_METHOD 'embedding' richiede EMBEDDINGS_ENABLED e sentence-transformers: ignorato.")
+
+    do_papers = args.phase in ("all", "papers")
+    do_objects = args.phase in ("all", "objects")
+    # MLT cerca in hw5_paragraphs: in quel caso tabelle/figure vanno dopo la barriera di refresh
+    objects_first_pass = do_papers and do_objects and "mlt" not in methods
+    indices = (PAPER_INDICES if do_papers else []) + (OBJECT_INDICES if do_objects else [])
+
+    # ES creerebbe da solo gli indici fisici mancanti, con mapping dinamico e fuori dall'alias
+    missing = missing_layout(es, indices)
+    if missing:
+        raise SystemExit(f"[ERR] Indici per sorgente mancanti ({', '.join(missing)}): esegui prima "
+                         "python -m src.indexing.es_setup (--recreate per un'installazione esistente)")
+
+    # i doc di un indice senza routing obbligatorio restano instradati per _id anche dopo
+    # un run delta (i file invariati non si reinviano): serve es_setup --recreate, poi il
+    # manifest vede i nuovi uuid e reinvia tutto per quegli indici
+    legacy = unrouted(es, sorted(ROUTED_INDICES & (set(indices) | {INDEX_PARAGRAPHS})))
+    if legacy:
+        raise SystemExit(f"[ERR] Indici senza _routing.required ({', '.join(legacy)}): esegui "
+                         "python -m src.indexing.es_setup --recreate e poi index_all (reinvio completo)")
+
+    manifest = IndexManifest()
+    dropped = manifest.sync_indices(es, {i: physical_indices(i) for i in indices})
+    if dropped and manifest.files:
+        print(f"[INFO] Indici ricreati o mancanti, reinvio completo: {', '.join(dropped)}")
+
+    counts = Counter()
+    # (ids, vettori) per lo store vettoriale locale; id cancellati per tipo
+    local_vecs = {kind: ([], []) for kind in INDEX_KIND.values()}
+    deleted = {kind: [] for kind in INDEX_KIND.values()}
+    # stato {indice: {_id: hash}} e indici fisici per file, scritto nel manifest solo dopo il bulk
+    pending = []
+    # (indice fisico, _id) -> tipo dei doc inviati nel gruppo corrente: solo i loro vettori,
+    # se ES li conferma, vanno nello store locale (non quelli invariati o nel dead-letter)
+    sent = {}
+
+    def delta(name: str, fhash: str, routing: str, source: str, actions: list[dict], pass_indices: list[str]):
+        old = {i: manifest.docs(name, i) for i in pass_indices}
+        targets = {i: physical_index(i, source) for i in pass_indices}
+        seen = {i: {} for i in pass_indices}
+        for a in actions:
+            i = a["_index"]
+            h = content_hash(a["_source"])
+            a["_source"]["content_hash"] = h
+            a["_index"] = targets[i]
+            seen[i][a["_id"]] = h
+            if args.full or old[i].get(a["_id"]) != h:
+                counts[i] += 1
+                sent[(a["_index"], a["_id"])] = INDEX_KIND[i]
+                yield a
+        for i in pass_indices:
+            for doc_id in old[i]:
+                if doc_id not in seen[i]:
+                    counts[f"{i}:deleted"] += 1
+                    deleted[INDEX_KIND[i]].append(doc_id)
+                    # il vecchio doc sta dove era stato scritto (la sorgente puo' essere cambiata)
+                    yield delete_action(i, doc_id, routing, manifest.target(name, i))
+        pending.append((name, fhash, routing, seen, targets))
+
+    def vanished(gone: list[str], pass_indices: list[str]):
+        for name in gone:
+            for i in pass_indices:
+                docs, routing, target = manifest.forget(name, i)
+                for doc_id in docs:
+                    counts[f"{i}:deleted"] += 1
+                    deleted[INDEX_KIND[i]].append(doc_id)
+                    yield delete_action(i, doc_id, routing, target)
+
+    def build_first(doc):
+        actions = paper_actions(doc, use_vec, local_vecs)
+        if objects_first_pass:
+            actions += object_actions(es, doc, use_vec, methods, local_vecs)
+        return actions
+
+    def build_objects(doc):
+        return object_actions(es, doc, use_vec, methods, local_vecs)
+
+    def run_bulk(actions) -> set:
+        """Invia il gruppo e aggiorna il manifest; ritorna i (tipo, _id) scritti con successo."""
+        # ignore 404: un doc del manifest puo' essere gia' sparito dall'indice
+        report = bulk_index(es, actions, ignore_status=(404,))
+        counts["failed"] += len(report.failed)
+        # i doc finiti nel dead-letter non entrano nel manifest e il loro file resta "cambiato":
+        # il prossimo run lo rilegge e reinvia solo quei doc
+        failed = report.failed_keys()
+        for name, fhash, routing, seen, targets in pending:
+            ok = {i: {d: h for d, h in docs.items() if (targets[i], d) not in failed} for i, docs in seen.items()}
+            clean = all(len(ok[i]) == len(seen[i]) for i in seen)
+            for i, docs in ok.items():
+                manifest.update(name, fhash if clean else "", i, docs, routing, targets[i])
+        pending.clear()
+        manifest.save()
+        acked = {(kind, doc_id) for (index, doc_id), kind in sent.items() if (index, doc_id) not in failed}
+        sent.clear()
+        return acked
+
+    def flush_vectors(acked: set):
+        if not (LOCAL_VECTOR_INDEX_ENABLED and (use_vec or any(deleted.values()))):
+            for ids, vecs in local_vecs.values():
+                ids.clear()
+                vecs.clear()
+            return
+        from ..vector_index import LocalVectorIndex
+        for kind, (all_ids, all_vecs) in local_vecs.items():
+            # i vettori nascono con le azioni, prima del delta: si tengono solo i doc confermati
+            keep = [j for j, doc_id in enumerate(all_ids) if (kind, doc_id) in acked]
+            ids = [all_ids[j] for j in keep]
+            vecs = [all_vecs[j] for j in keep]
+            all_ids.clear()
+            all_vecs.clear()
+            store = LocalVectorIndex(kind)
+            if deleted[kind]:
+                store.delete(deleted[kind])
+            if ids:
+                store.upsert(ids, vecs)
+            # ogni upsert di un id esistente lascia una riga morta che search scandisce comunque
+            if store.dead_ratio() > VECTOR_COMPACT_DEAD_RATIO:
+                store.compact()
+                counts[f"vectors:{kind}:compacted"] += 1
+            counts[f"vectors:{kind}"] += len(ids)
+            deleted[kind].clear()
+
+    def run_pass(pass_name: str, docs, gone, pass_indices: list[str], build):
+        """Invia i file a gruppi: dopo ogni gruppo confermato aggiorna manifest, vettori e checkpoint."""
+        todo = [d for d in docs if not checkpoint.done(pass_name, d[0])]
+        if len(todo) < len(docs):
+            print(f"[INFO] {pass_name}: {len(docs) - len(todo)} file gia' completati (checkpoint), {len(todo)} da fare.")
+        groups = [todo[s:s + CHECKPOINT_EVERY_FILES] for s in range(0, len(todo), CHECKPOINT_EVERY_FILES)] or [[]]
+        for n, group in enumerate(groups):
+            actions = (
+                a for name, fhash, doc in group
+                for a in delta(name, fhash, paper_doc_id(doc), doc.get("source", "unk"), build(doc), pass_indices)
+            )
+            if n == len(groups) - 1:
+                actions = chain(actions, vanished(gone, pass_indices))
+            flush_vectors(run_bulk(actions))
+            checkpoint.mark(pass_name, [name for name, _, _ in group])
+
+    run = {"phase": args.phase, "full": args.full}
+    checkpoint = Checkpoint()
+    if args.resume and checkpoint.matches(**run):
+        print(f"[INFO] Ripresa dal checkpoint: {checkpoint.summary()}")
+    else:
+        if args.resume:
+            print("[WARN] Nessun checkpoint compatibile (fase/--full diversi o run completato): si riparte da zero.")
+        checkpoint.start(**run)
+
+    with timed("index_all", {**run, "resume": args.resume}):
+        changed, gone = load_changed(manifest, indices, args.full)
+        print(f"[INFO] {len(changed)} documenti intermedi nuovi o modificati, {len(gone)} rimossi.")
+
+        if do_papers:
+            pass_indices = PAPER_INDICES + (OBJECT_INDICES if objects_first_pass else [])
+            with timed("index_all:first_pass"):
+                run_pass("first_pass", changed, gone, pass_indices, build_first)
+
+        if do_objects and not objects_first_pass:
+            # barriera: i paragrafi appena inviati devono essere visibili a more_like_this
+            es.indices.refresh(index=INDEX_PARAGRAPHS)
+            with timed("index_all:objects"):
+                run_pass("objects", changed, gone, OBJECT_INDICES, build_objects)
+
+        # invalida la cache dei risultati di search_core solo per gli indici modificati,
+        # dopo il refresh (prima del bump le modifiche devono essere gia' visibili)
+        touched = sorted({k.split(":")[0] for k in counts if k.split(":")[0] in INDEX_KIND})
+        if touched:
+            es.indices.refresh(index=touched)
+            bump_generation(es, touched)
+
+    checkpoint.clear()
+    print("[DONE] Indicizzazione completata: " + (", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "nessuna modifica"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,28 @@
 
 
-import json
 import re
 from collections import OrderedDict
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 from ..config import (
-    ES_HOST,
     INDEX_TABLES,
     INDEX_FIGURES,
     INDEX_PARAGRAPHS,
-    INTERMEDIATE_DIR,
     CONTEXT_METHOD,
     OVERLAP_THRESHOLD,
     CONTEXT_TOP_K,
-    EMBEDDINGS_ENABLED,
+    EMBEDDING_CONTEXT_MIN_SIM,
+    MIN_PARAGRAPH_CHARS,
+    ROUTE_OBJECTS_BY_PAPER,
+    MENTION_WINDOW_CHARS,
+    CONTEXT_WINDOW_CHARS,
 )
-from ..embeddings import available as embeddings_available, embed
-from ..utils import tokenize_informative, timed
+from ..embeddings import embed_array
+from ..utils import tokenize_informative, physical_index
+from .index_papers import paper_doc_id as make_paper_doc_id
 
-def mlt_context(es: Elasticsearch, paper_doc_id: str, like_text: str, k: int = 5):
+def mlt_context(es: Elasticsearch, paper_doc_id: str, like_text: str, k: int = 5,
+                index: str = INDEX_PARAGRAPHS) -> list[int]:
+    """Indici (para_id) dei paragrafi del paper piu' simili a like_text (index: fisico della sorgente)."""
     if not like_text or len(like_text) < 20:
         return []
     
@@ -26,7 +30,7 @@ def mlt_context(es: Elasticsearch, paper_doc_id: str, like_text: str, k: int = 5
     # Qui usiamo more_like_this che gestisce il testo raw
     body = {
         "size": k,
-        "_source": ["text"],
+        "_source": ["para_id"],
         "query": {
             "bool": {
                 "filter": [{"term": {"paper_id": paper_doc_id}}],
@@ -44,157 +48,269 @@ def mlt_context(es: Elasticsearch, paper_doc_id: str, like_text: str, k: int = 5
         }
     }
     try:
-        res = es.search(index=INDEX_PARAGRAPHS, body=body, request_timeout=30)
-        return [h["_source"]["text"] for h in res["hits"]["hits"]]
+        # paragrafi indicizzati con routing=paper_id: la query tocca un solo shard
+        res = es.search(index=index, body=body, routing=paper_doc_id, request_timeout=30)
+        return [h["_source"]["para_id"] for h in res["hits"]["hits"]]
     except Exception as e:
         print(f"Errore MLT per {paper_doc_id}: {e}")
         return []
 
-def overlap_context(paragraphs: list[str], like_text: str, threshold: float, k: int) -> list[str]:
+def overlap_context(paragraphs: list[str], like_text: str, threshold: float, k: int) -> list[int]:
     terms = set(tokenize_informative(like_text))
     if not terms:
         return []
     scored = []
-    for p in paragraphs:
+    for i, p in enumerate(paragraphs):
         pt = set(tokenize_informative(p))
         if not pt: continue
         score = len(terms & pt) / len(terms)
         if score >= threshold:
-            scored.append((score, p))
+            scored.append((score, i))
     scored.sort(key=lambda x: x[0], reverse=True)
-    return [p for _, p in scored[:k]]
+    return [i for _, i in scored[:k]]
 
-def dedup_keep_order(items: list[str]) -> list[str]:
+def context_methods(method: str = CONTEXT_METHOD) -> set[str]:
+    """"hybrid" = mlt + overlap; altrimenti metodi separati da "+" (es. "mlt+embedding")."""
+    if method == "hybrid":
+        return {"mlt", "overlap"}
+    return {m.strip() for m in method.split("+") if m.strip()}
+
+def paper_similarities(paragraphs: list[str], like_texts: list[str]):
+    """
+    Coseno oggetti x paragrafi di un paper: un batch di inferenza per i paragrafi,
+    uno per le caption, una sola moltiplicazione di matrici.
+    Ritorna (sims, caption_vecs) oppure (None, None) se gli embeddings non sono disponibili.
+    """
+    if not paragraphs or not like_texts:
+        return None, None
+    para_vecs = embed_array(paragraphs)
+    cap_vecs = embed_array(like_texts)
+    if para_vecs is None or cap_vecs is None:
+        return None, None
+    return cap_vecs @ para_vecs.T, cap_vecs
+
+def embedding_context(sims_row, min_sim: float, k: int) -> list[int]:
+    import numpy as np
+
+    if sims_row is None or not len(sims_row):
+        return []
+    kk = min(k, len(sims_row))
+    idx = np.argpartition(-sims_row, kk - 1)[:kk]
+    idx = idx[np.argsort(-sims_row[idx])]
+    return [int(i) for i in idx if sims_row[i] >= min_sim]
+
+def dedup_keep_order(items: list[int]) -> list[int]:
     od = OrderedDict()
     for x in items:
-        if x and x not in od:
+        if x is not None and x not in od:
             od[x] = 1
     return list(od.keys())
 
-def main():
-    es = Elasticsearch(ES_HOST, request_timeout=120, max_retries=3, retry_on_timeout=True)
-    use_vec = EMBEDDINGS_ENABLED and embeddings_available()
-
-    table_actions = []
-    fig_actions = []
-
-    files = list(INTERMEDIATE_DIR.glob("*.json"))
-    print(f"Indicizzazione di {len(files)} documenti...")
-
-    with timed("index_tables_figures"):
-        for path in files:
-            try:
-                doc = json.loads(path.read_text(encoding="utf-8"))
-            except json.JSONDecodeError:
-                continue
-                
-            pid = doc.get("paper_id")
-            source = doc.get("source", "unk")
-            # ID univoco del paper in ES
-            paper_doc_id = f"{source}_{pid}"
-            paragraphs = doc.get("paragraphs", [])
-
-            # --- TABLES ---
-            for t in doc.get("tables", []):
-                tid = t.get("table_id", "T0")
-                caption = t.get("caption", "")
-                body_text = t.get("body", "")
-                
-                # Cerca mention tipo "Table 1" o "Tab. 1"
-                # Rimuoviamo 'T' dall'ID per cercare il numero (es. T1 -> 1)
-                num_id = re.escape(tid.replace("T", ""))
-                mention_pat = rf"\b(table|tab\.?)\s*{num_id}\b"
-                
-                mentions = [p for p in paragraphs if re.search(mention_pat, p, flags=re.IGNORECASE)]
-                
-                # Context Retrieval
-                like_txt = (caption + " " + body_text).strip()
-                ctx_paras = []
-                
-                if like_txt:
-                    ctx_mlt = mlt_context(es, paper_doc_id, like_txt, k=CONTEXT_TOP_K) if "mlt" in CONTEXT_METHOD else []
-                    ctx_ov = overlap_context(paragraphs, like_txt, OVERLAP_THRESHOLD, CONTEXT_TOP_K) if "overlap" in CONTEXT_METHOD else []
-                    ctx_paras = dedup_keep_order(ctx_mlt + ctx_ov)
-
-                # Embedding
-                vec = None
-                if use_vec and caption:
-                    vec = embed([caption])[0]
-
-                src = {
-                    "paper_id": paper_doc_id,
-                    "table_id": tid,
-                    "caption": caption,
-                    "body": body_text,
-                    "table_html": t.get("table_html", ""),
-                    "mentions": mentions,
-                    "context_paragraphs": ctx_paras,
-                    "url": doc.get("url", ""),
-                    "source": source,
-                    "date": doc.get("date"), # Utile per filtri
-                    "doc_url": doc.get("doc_url") or doc.get("url", ""),
-
-                }
-                if vec: src["caption_vec"] = vec # O caption_body_vec
-
-                table_actions.append({
-                    "_index": INDEX_TABLES,
-                    "_id": f"{paper_doc_id}_{tid}",
-                    "_source": src
-                })
-
-            # --- FIGURES ---
-            for f in doc.get("figures", []):
-                fid = f.get("figure_id", "F0")
-                caption = f.get("caption", "")
-                
-                num_id = re.escape(fid.replace("F", ""))
-                mention_pat = rf"\b(figure|fig\.?)\s*{num_id}\b"
-                
-                mentions = [p for p in paragraphs if re.search(mention_pat, p, flags=re.IGNORECASE)]
-                
-                ctx_paras = []
-                if caption:
-                    ctx_mlt = mlt_context(es, paper_doc_id, caption, k=CONTEXT_TOP_K) if "mlt" in CONTEXT_METHOD else []
-                    ctx_ov = overlap_context(paragraphs, caption, OVERLAP_THRESHOLD, CONTEXT_TOP_K) if "overlap" in CONTEXT_METHOD else []
-                    ctx_paras = dedup_keep_order(ctx_mlt + ctx_ov)
-
-                vec = None
-                if use_vec and caption:
-                    vec = embed([caption])[0]
-
-                src = {
-                    "paper_id": paper_doc_id,
-                    "figure_id": fid,
-                    "caption": caption,
-                    "figure_url": f.get("figure_url", ""),
-                    "mentions": mentions,
-                    "context_paragraphs": ctx_paras,
-                    "url": doc.get("url", ""),
-                    "source": source,
-                    "date": doc.get("date"),
-                    "doc_url": doc.get("doc_url") or doc.get("url", ""),
-
-                }
-                if vec: src["caption_vec"] = vec
-
-                fig_actions.append({
-                    "_index": INDEX_FIGURES,
-                    "_id": f"{paper_doc_id}_{fid}",
-                    "_source": src
-                })
-
-    # Bulk Indexing
-    if table_actions:
-        print(f"Caricamento {len(table_actions)} tabelle...")
-        helpers.bulk(es, table_actions, request_timeout=120, refresh=False)
-    
-    if fig_actions:
-        print(f"Caricamento {len(fig_actions)} figure...")
-        helpers.bulk(es, fig_actions, request_timeout=120, refresh=False)
+def find_mentions(paragraphs: list[str], pattern: str) -> list[tuple[int, int, int]]:
+    """(para_id, start, end) della prima mention di pattern in ogni paragrafo."""
+    rx = re.compile(pattern, flags=re.IGNORECASE)
+    out = []
+    for i, p in enumerate(paragraphs):
+        m = rx.search(p)
+        if m:
+            out.append((i, m.start(), m.end()))
+    return out
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def mention_window(paragraph: str, start: int, end: int, chars: int = MENTION_WINDOW_CHARS) -> str:
+    """Testo attorno alla mention (chars per lato), tagliato sui confini di parola."""
+    a, b = max(0, start - chars), min(len(paragraph), end + chars)
+    if a > 0:
+        a = paragraph.find(" ", a, start) + 1 or a
+    if b < len(paragraph):
+        cut = paragraph.rfind(" ", end, b)
+        b = cut if cut > 0 else b
+    return paragraph[a:b].strip()
+
+def context_window(paragraph: str, terms: set[str], chars: int = CONTEXT_WINDOW_CHARS) -> str:
+    """Frasi del paragrafo con piu' termini in comune con la caption (in ordine originale), fino a chars."""
+    sentences = [s for s in _SENTENCE_END_RE.split(paragraph) if s.strip()]
+    overlap = [len(terms & set(tokenize_informative(s))) for s in sentences]
+    # solo frasi con termini in comune (la prima frase se nessuna ne ha)
+    ranked = sorted((i for i in range(len(sentences)) if overlap[i]), key=lambda i: -overlap[i]) or [0][:len(sentences)]
+    keep, used = [], 0
+    for i in ranked:
+        if keep and used + len(sentences[i]) > chars:
+            break
+        keep.append(i)
+        used += len(sentences[i])
+    return " ".join(sentences[i] for i in sorted(keep))[:chars]
+
+def paragraph_refs(paper_doc_id: str, paragraphs: list[str], para_ids: list[int], mentions=None) -> list[dict]:
+    """
+    Riferimenti ai doc di hw5_paragraphs (stesso _id usato da index_papers) al posto
+    del testo duplicato; start/end = offset della mention nel paragrafo.
+    """
+    spans = {i: (a, b) for i, a, b in (mentions or [])}
+    refs = []
+    for i in para_ids:
+        if len(paragraphs[i]) < MIN_PARAGRAPH_CHARS:
+            continue  # non indicizzato in hw5_paragraphs
+        ref = {"id": f"{paper_doc_id}_{i}", "para_id": i}
+        if i in spans:
+            ref["start"], ref["end"] = spans[i]
+        refs.append(ref)
+    return refs
+
+def object_actions(es: Elasticsearch, doc: dict, use_vec: bool, methods: set[str], local_vecs: dict) -> list[dict]:
+    """
+    Azioni bulk (tabelle + figure) per un documento intermedio.
+    Con "mlt" tra i metodi i paragrafi del paper devono essere gia' indicizzati e visibili (refresh).
+    local_vecs: {"table": (ids, vecs), "figure": (ids, vecs)} per lo store vettoriale locale.
+    """
+    actions = []
+
+    source = doc.get("source", "unk")
+    # ID univoco del paper in ES
+    paper_doc_id = make_paper_doc_id(doc)
+    routing = {"_routing": paper_doc_id} if ROUTE_OBJECTS_BY_PAPER else {}
+    paragraphs_index = physical_index(INDEX_PARAGRAPHS, source)
+    paragraphs = doc.get("paragraphs", [])
+    tables = doc.get("tables", [])
+    figures = doc.get("figures", [])
+    # metadati del paper padre denormalizzati (titolo in card, filtri per data/autori)
+    parent = {
+        "paper_title": doc.get("title", ""),
+        "authors": doc.get("authors", []),
+        "date": doc.get("date"),
+    }
+
+    # Caption di tutti gli oggetti del paper in un solo batch (tabelle, poi figure):
+    # servono sia per il contesto "embedding" sia per caption_vec.
+    cap_sims, cap_vecs = None, None
+    if use_vec and (tables or figures):
+        captions = [x.get("caption", "") or x.get("body", "") for x in tables + figures]
+        if "embedding" in methods:
+            cap_sims, cap_vecs = paper_similarities(paragraphs, captions)
+        if cap_vecs is None:
+            cap_vecs = embed_array(captions)
+
+    # --- TABLES ---
+    for ti, t in enumerate(tables):
+        tid = t.get("table_id", "T0")
+        caption = t.get("caption", "")
+        body_text = t.get("body", "")
+
+        # Cerca mention tipo "Table 1" o "Tab. 1"
+        # Rimuoviamo 'T' dall'ID per cercare il numero (es. T1 -> 1)
+        num_id = re.escape(tid.replace("T", ""))
+        mention_pat = rf"\b(table|tab\.?)\s*{num_id}\b"
+
+        mentions = find_mentions(paragraphs, mention_pat)
+        mention_ids = [i for i, _, _ in mentions]
+
+        # Context Retrieval
+        like_txt = (caption + " " + body_text).strip()
+        ctx_paras = []
+
+        if like_txt:
+            ctx_mlt = mlt_context(es, paper_doc_id, like_txt, k=CONTEXT_TOP_K, index=paragraphs_index) if "mlt" in methods else []
+            ctx_ov = overlap_context(paragraphs, like_txt, OVERLAP_THRESHOLD, CONTEXT_TOP_K) if "overlap" in methods else []
+            ctx_emb = embedding_context(cap_sims[ti], EMBEDDING_CONTEXT_MIN_SIM, CONTEXT_TOP_K) if cap_sims is not None else []
+            ctx_paras = dedup_keep_order(ctx_mlt + ctx_ov + ctx_emb)
+
+        # Embedding
+        vec = None
+        if cap_vecs is not None and caption:
+            vec = cap_vecs[ti].tolist()
+
+        like_terms = set(tokenize_informative(like_txt))
+        src = {
+            "paper_id": paper_doc_id,
+            "kind": "table",
+            "table_id": tid,
+            "caption": caption,
+            "body": body_text,
+            "table_html": t.get("table_html", ""),
+            # finestre compatte solo indicizzate (escluse da _source in es_setup): il testo
+            # dei paragrafi si legge da hw5_paragraphs tramite i *_refs
+            "mentions": [mention_window(paragraphs[i], a, b) for i, a, b in mentions],
+            "context_paragraphs": [context_window(paragraphs[i], like_terms) for i in ctx_paras],
+            "mention_refs": paragraph_refs(paper_doc_id, paragraphs, mention_ids, mentions),
+            "context_refs": paragraph_refs(paper_doc_id, paragraphs, ctx_paras),
+            "url": doc.get("url", ""),
+            "source": source,
+            **parent,
+            "doc_url": doc.get("doc_url") or doc.get("url", ""),
+
+        }
+        if vec:
+            src["caption_vec"] = vec # O caption_body_vec
+            local_vecs["table"][0].append(f"{paper_doc_id}_{tid}")
+            local_vecs["table"][1].append(vec)
+
+        actions.append({
+            "_index": INDEX_TABLES,
+            "_id": f"{paper_doc_id}_{tid}",
+            **routing,
+            "_source": src
+        })
+
+    # --- FIGURES ---
+    for fi, f in enumerate(figures, start=len(tables)):
+        fid = f.get("figure_id", "F0")
+        caption = f.get("caption", "")
+
+        num_id = re.escape(fid.replace("F", ""))
+        mention_pat = rf"\b(figure|fig\.?)\s*{num_id}\b"
+
+        mentions = find_mentions(paragraphs, mention_pat)
+        mention_ids = [i for i, _, _ in mentions]
+
+        ctx_paras = []
+        if caption:
+            ctx_mlt = mlt_context(es, paper_doc_id, caption, k=CONTEXT_TOP_K, index=paragraphs_index) if "mlt" in methods else []
+            ctx_ov = overlap_context(paragraphs, caption, OVERLAP_THRESHOLD, CONTEXT_TOP_K) if "overlap" in methods else []
+            ctx_emb = embedding_context(cap_sims[fi], EMBEDDING_CONTEXT_MIN_SIM, CONTEXT_TOP_K) if cap_sims is not None else []
+            ctx_paras = dedup_keep_order(ctx_mlt + ctx_ov + ctx_emb)
+
+        vec = None
+        if cap_vecs is not None and caption:
+            vec = cap_vecs[fi].tolist()
+
+        like_terms = set(tokenize_informative(caption))
+        src = {
+            "paper_id": paper_doc_id,
+            "kind": "figure",
+            "figure_id": fid,
+            "caption": caption,
+            "figure_url": f.get("figure_url", ""),
+            "mentions": [mention_window(paragraphs[i], a, b) for i, a, b in mentions],
+            "context_paragraphs": [context_window(paragraphs[i], like_terms) for i in ctx_paras],
+            "mention_refs": paragraph_refs(paper_doc_id, paragraphs, mention_ids, mentions),
+            "context_refs": paragraph_refs(paper_doc_id, paragraphs, ctx_paras),
+            "url": doc.get("url", ""),
+            "source": source,
+            **parent,
+            "doc_url": doc.get("doc_url") or doc.get("url", ""),
+
+        }
+        if vec:
+            src["caption_vec"] = vec
+            local_vecs["figure"][0].append(f"{paper_doc_id}_{fid}")
+            local_vecs["figure"][1].append(vec)
+
+        actions.append({
+            "_index": INDEX_FIGURES,
+            "_id": f"{paper_doc_id}_{fid}",
+            **routing,
+            "_source": src
+        })
+
+    return actions
+
 
-    print(f"[DONE] Indicizzazione completata: table={len(table_actions)}, figure={len(fig_actions)}")
+def main(argv: list[str] | None = None):
+    # Wrapper legacy: il corpus si indicizza in un solo passaggio con index_all
+    from . import index_all
+    index_all.main(["--phase", "objects", *(argv or [])])
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,132 @@
+"""
+Stato locale dell'indicizzazione (data/cache/).
+
+IndexManifest (indicizzazione delta): per ogni file intermedio e ogni indice logico, hash del
+file all'ultimo invio riuscito, {_id: content_hash} dei doc inviati e indice fisico di
+destinazione. Gli uuid degli indici fisici invalidano le voci quando un indice viene
+ricreato (es_setup --recreate, anche per una sola sorgente).
+
+Checkpoint (index_all --resume): file gia' inviati e confermati da ES per ogni passata
+del run in corso; viene cancellato quando il run termina.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from ..config import INDEX_MANIFEST_PATH, INDEX_CHECKPOINT_PATH
+
+
+def content_hash(src: dict) -> str:
+    payload = json.dumps(src, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class IndexManifest:
+    def __init__(self, path: Path = INDEX_MANIFEST_PATH):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+        self.indices: Dict[str, str] = data.get("indices", {})
+        # file -> indice -> {"hash": sha1 file, "docs": {_id: content_hash}}
+        self.files: Dict[str, Dict[str, dict]] = data.get("files", {})
+
+    def sync_indices(self, es, indices: Dict[str, List[str]]) -> List[str]:
+        """
+        indices: {indice logico: indici fisici}. Aggiorna gli uuid; le voci su indici fisici
+        ricreati, mancanti o non piu' in uso perdono i doc. Ritorna i fisici invalidati.
+        """
+        dropped = []
+        live = set()
+        for name in (p for physical in indices.values() for p in physical):
+            try:
+                info = es.indices.get(index=name)
+                uuid = "|".join(sorted(v["settings"]["index"]["uuid"] for v in info.values()))
+            except Exception:
+                uuid = ""
+            if not uuid or self.indices.get(name) != uuid:
+                dropped.append(name)
+            else:
+                live.add(name)
+            self.indices[name] = uuid
+        for entry in self.files.values():
+            for index in indices:
+                if index in entry and entry[index].get("index", index) not in live:
+                    entry.pop(index)
+        return dropped
+
+    def unchanged(self, name: str, fhash: str, indices: List[str]) -> bool:
+        entry = self.files.get(name) or {}
+        return all((entry.get(i) or {}).get("hash") == fhash for i in indices)
+
+    def docs(self, name: str, index: str) -> Dict[str, str]:
+        return ((self.files.get(name) or {}).get(index) or {}).get("docs", {})
+
+    def target(self, name: str, index: str) -> str:
+        """Indice fisico in cui stanno i doc del file per l'indice logico `index`."""
+        return ((self.files.get(name) or {}).get(index) or {}).get("index", index)
+
+    def update(self, name: str, fhash: str, index: str, docs: Dict[str, str], routing: str = "",
+               target: str = "") -> None:
+        self.files.setdefault(name, {})[index] = {
+            "hash": fhash, "docs": docs, "routing": routing, "index": target or index,
+        }
+
+    def forget(self, name: str, index: str) -> Tuple[Dict[str, str], str, str]:
+        """Rimuove le voci di un file sparito; ritorna (doc da cancellare, routing, indice fisico)."""
+        entry = self.files.get(name) or {}
+        removed = entry.pop(index, None) or {}
+        if not entry:
+            self.files.pop(name, None)
+        return removed.get("docs", {}), removed.get("routing", ""), removed.get("index", index)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"indices": self.indices, "files": self.files}), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+class Checkpoint:
+    def __init__(self, path: Path = INDEX_CHECKPOINT_PATH):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+        self.run: Dict[str, object] = data.get("run", {})
+        self.passes: Dict[str, set] = {k: set(v) for k, v in data.get("done", {}).items()}
+
+    def matches(self, **run) -> bool:
+        """True se il checkpoint su disco appartiene a un run con gli stessi parametri."""
+        return bool(self.run) and self.run == run
+
+    def start(self, **run) -> None:
+        self.run = run
+        self.passes = {}
+        self.save()
+
+    def done(self, pass_name: str, name: str) -> bool:
+        return name in self.passes.get(pass_name, ())
+
+    def mark(self, pass_name: str, names: List[str]) -> None:
+        self.passes.setdefault(pass_name, set()).update(names)
+        self.save()
+
+    def summary(self) -> str:
+        return ", ".join(f"{k}={len(v)}" for k, v in sorted(self.passes.items())) or "nessun file"
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "run": self.run,
+            "done": {k: sorted(v) for k, v in self.passes.items()},
+        }), encoding="utf-8")
+        tmp.replace(self.path)
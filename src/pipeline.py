@@ -1,7 +1,7 @@
 import argparse
 import sys
 
-from .indexing import es_setup, index_papers, index_tables_figures
+from .indexing import es_setup, index_all
 
 from .scrape import scrape_arxiv, scrape_pmc 
 from . import build_intermediate
@@ -27,8 +27,7 @@ def main():
         scrape_pmc.main()
 
     build_intermediate.main()
-    index_papers.main()
-    index_tables_figures.main()
+    index_all.main([])
 
     print("[DONE] Pipeline completata.")
 
@@ -2,7 +2,6 @@ import os
 import re
 import sys
 from pathlib import Path
-from turtle import mode
 from typing import List, Optional, Dict, Any, Tuple
 
 import streamlit as st
@@ -15,6 +14,20 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 sys.path.append(str(PROJECT_ROOT))
 
 from src.config import ES_HOST, INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES  # noqa
+from src.search.search_core import (  # noqa
+    fetch_paragraphs,
+    get_details,
+    run_plan,
+    search_index,
+    search_plan,
+    grouped_search,
+    fuse_hits,
+    merge_by_recency,
+    resolve_paper_titles,
+    with_shingles,
+    SearchFilters,
+    LIST_SOURCE_FIELDS,
+)
 
 IMAGES_DIR = PROJECT_ROOT / "data" / "images"
 
@@ -28,111 +41,66 @@ def es_search_auto(
     query: str,
     fields: List[str],
     size: int = 20,
-    source_filter: Optional[str] = None,
-    **kwargs,  
+    filters: Optional[SearchFilters] = None,
+    source_includes: Optional[List[str]] = None,
+    mode: str = "auto",
+    sort: str = "relevance",
+    budget_ms: Optional[int] = None,
+    facets: bool = False,
 ) -> Dict[str, Any]:
-    filters = []
-
-    if source_filter:
-        filters.append({"term": {"source": source_filter}})
-
-    q = (query or "").strip()
-
-    mode_norm = str(mode or "auto").strip().lower()
-
-    if mode_norm == "boolean":
-        tokens = tokenize_boolean(q)
-        rpn = to_rpn(tokens)
-        es_q = rpn_to_es_query(rpn, fields)
+    # stesso percorso di CLI ed eval (indice per sorgente, ricerca a tier, cache, budget);
+    # con facets le aggregazioni arrivano nella stessa risposta (res["facets"])
+    return search_index(
+        es,
+        index,
+        query,
+        fields,
+        size,
+        filters,
+        source_includes,
+        mode=mode,
+        fuzziness=None,
+        sort=sort,
+        budget_ms=budget_ms,
+        facets=facets,
+    )
 
-    elif mode_norm == "fulltext":
-        es_q = {
-            "multi_match": {
-                "query": q,
-                "fields": fields,
-                "type": "best_fields",
-                "operator": "and",
-            }
-        }
 
-    else:
-        # auto
-        if looks_boolean(q):
-            tokens = tokenize_boolean(q)
-            rpn = to_rpn(tokens)
-            es_q = rpn_to_es_query(rpn, fields)
-        else:
-            es_q = {
-                "multi_match": {
-                    "query": q,
-                    "fields": fields,
-                    "type": "best_fields",
-                    "operator": "and",
-                }
-            }
+# ============================================================
+# LAZY PARAGRAPH FETCH (mention_refs / context_refs)
+# ============================================================
+@st.cache_data(ttl=600, show_spinner=False)
+def load_details(_es: Elasticsearch, kind: str, doc_id: str, paper_id: str = "") -> Dict[str, Any]:
+    return get_details(_es, kind, doc_id, paper_id=paper_id or None)
 
 
-    body = {
-        "size": size,
-        "query": {
-            "bool": {
-                "filter": filters,
-                "must": [es_q],
-            }
-        }
-    }
-    return es.search(index=index, body=body, request_timeout=30)
+@st.cache_data(ttl=600, show_spinner=False)
+def load_paragraphs(_es: Elasticsearch, para_ids: Tuple[str, ...]) -> Dict[str, str]:
+    return fetch_paragraphs(_es, list(para_ids))
 
 
-# ============================================================
-# PAPER TITLE LOOKUP (for table/figure cards)
-# ============================================================
-def get_paper_title_cached(
+def render_paragraph_refs(
+    label: str,
+    refs: List[Dict[str, Any]],
     es: Elasticsearch,
-    paper_doc_id: str,
-    cache: Dict[str, str],
-) -> str:
+    key: str,
+):
     """
-    paper_doc_id nel tuo indexing di tables/figures è: "<source>_<paper_id>".
-    Qui proviamo a recuperare il titolo dal papers index in modo robusto:
-      1) GET per _id (se hai indicizzato papers con lo stesso _id)
-      2) fallback: search term su field "paper_id" (se paper_id contiene paper_doc_id)
+    Expander con i paragrafi referenziati: il testo arriva con un mget solo
+    quando l'utente attiva il toggle dentro la card.
     """
-    if not paper_doc_id:
-        return ""
-    if paper_doc_id in cache:
-        return cache[paper_doc_id]
-
-    title = ""
-
-    # (1) try by _id
-    try:
-        doc = es.get(index=INDEX_PAPERS, id=paper_doc_id, request_timeout=10)
-        src = doc.get("_source", {}) if isinstance(doc, dict) else {}
-        title = (src.get("title") or "").strip()
-    except Exception:
-        pass
-
-    # (2) fallback: term on paper_id
-    if not title:
-        try:
-            res = es.search(
-                index=INDEX_PAPERS,
-                body={
-                    "size": 1,
-                    "_source": ["title"],
-                    "query": {"term": {"paper_id": paper_doc_id}},
-                },
-                request_timeout=10,
-            )
-            hits = res.get("hits", {}).get("hits", [])
-            if hits:
-                title = (hits[0].get("_source", {}).get("title") or "").strip()
-        except Exception:
-            pass
-
-    cache[paper_doc_id] = title
-    return title
+    with st.expander(f"{label} ({len(refs)})"):
+        if not st.toggle("Carica testo", key=key):
+            return
+        texts = load_paragraphs(es, tuple(r.get("id", "") for r in refs[:30]))
+        for r in refs[:30]:
+            txt = texts.get(r.get("id", ""), "")
+            if not txt:
+                continue
+            start, end = r.get("start"), r.get("end")
+            if isinstance(start, int) and isinstance(end, int) and 0 <= start < end <= len(txt):
+                txt = f"{txt[:start]}**{txt[start:end]}**{txt[end:]}"
+            st.write(f"- {txt}")
 
 
 # ============================================================
@@ -237,7 +205,8 @@ def render_card(
     score: float,
     src: Dict[str, Any],
     es: Elasticsearch,
-    paper_title_cache: Dict[str, str],
+    paper_titles: Dict[str, str],
+    doc_id: str = "",
 ):
     source = (src.get("source") or "UNK").lower()
     paper_doc_id = src.get("paper_id") or ""  # per tables/figures è <source>_<paper_id>
@@ -248,7 +217,7 @@ def render_card(
 
     paper_title = ""
     if kind in ("table", "figure") and paper_doc_id:
-        paper_title = get_paper_title_cached(es, paper_doc_id, paper_title_cache)
+        paper_title = (src.get("paper_title") or "").strip() or paper_titles.get(paper_doc_id, "")
 
     # --- titolo card ---
     if kind == "paper":
@@ -303,32 +272,30 @@ def render_card(
 
 
 
-        # Mentions + Context
-        mentions = src.get("mentions", [])
-        if isinstance(mentions, list) and mentions:
-            with st.expander(f"📌 Mentions ({len(mentions)})"):
-                for m in mentions[:30]:
-                    st.write(f"- {m}")
+        # Mentions + Context (riferimenti a hw5_paragraphs, testo caricato on demand)
+        mention_refs = src.get("mention_refs") or []
+        if isinstance(mention_refs, list) and mention_refs:
+            render_paragraph_refs("📌 Mentions", mention_refs, es, key=f"mentions:{doc_id}")
 
-        ctx = src.get("context_paragraphs", [])
-        if isinstance(ctx, list) and ctx:
-            with st.expander(f"🌐 Context paragraphs ({len(ctx)})"):
-                for p in ctx[:30]:
-                    st.write(f"- {p}")
+        ctx_refs = src.get("context_refs") or []
+        if isinstance(ctx_refs, list) and ctx_refs:
+            render_paragraph_refs("🌐 Context paragraphs", ctx_refs, es, key=f"context:{doc_id}")
 
-        # Table rendering
+        # Table rendering (table_html/body non sono nel _source della lista)
         if kind == "table":
-            html_content = src.get("table_html")
-            body_txt = src.get("body") or ""
             with st.expander("🔎 Visualizza tabella"):
-                if isinstance(html_content, str) and html_content.strip():
-                    st.components.v1.html(
-                        f"<div style='overflow-x:auto; font-family:sans-serif;'>{html_content}</div>",
-                        height=360,
-                        scrolling=True,
-                    )
-                else:
-                    st.write(body_txt[:2500] + ("..." if len(body_txt) > 2500 else ""))
+                if st.toggle("Carica tabella", key=f"table:{doc_id}"):
+                    details = load_details(es, "table", doc_id, paper_doc_id)
+                    html_content = details.get("table_html")
+                    body_txt = details.get("body") or ""
+                    if isinstance(html_content, str) and html_content.strip():
+                        st.components.v1.html(
+                            f"<div style='overflow-x:auto; font-family:sans-serif;'>{html_content}</div>",
+                            height=360,
+                            scrolling=True,
+                        )
+                    else:
+                        st.write(body_txt[:2500] + ("..." if len(body_txt) > 2500 else ""))
 
         # Figure rendering
         if kind == "figure":
@@ -374,150 +341,6 @@ def render_card(
 
         st.divider()
 
-BOOL_OPS = {"AND", "OR", "NOT"}
-
-def looks_boolean(q: str) -> bool:
-    if not q:
-        return False
-    # basta che contenga AND/OR/NOT come token oppure parentesi
-    return bool(re.search(r"\b(AND|OR|NOT)\b", q, flags=re.IGNORECASE)) or ("(" in q) or (")" in q)
-
-def tokenize_boolean(q: str) -> List[str]:
-    """
-    Tokenizza:
-      - "frasi tra virgolette"
-      - AND/OR/NOT
-      - parentesi
-      - parole/termini
-    """
-    tokens = []
-    i = 0
-    n = len(q)
-    while i < n:
-        c = q[i]
-        if c.isspace():
-            i += 1
-            continue
-        if c in "()":
-            tokens.append(c)
-            i += 1
-            continue
-        if c == '"':
-            j = i + 1
-            while j < n and q[j] != '"':
-                j += 1
-            phrase = q[i+1:j] if j < n else q[i+1:]
-            tokens.append(f'"{phrase}"')
-            i = j + 1 if j < n else n
-            continue
-
-        # parola / operatore
-        j = i
-        while j < n and (not q[j].isspace()) and q[j] not in "()":
-            j += 1
-        tok = q[i:j]
-        tokens.append(tok)
-        i = j
-    return tokens
-
-def to_rpn(tokens: List[str]) -> List[str]:
-    """
-    Shunting-yard: NOT > AND > OR
-    """
-    prec = {"NOT": 3, "AND": 2, "OR": 1}
-    out = []
-    stack = []
-
-    def is_op(t: str) -> bool:
-        return t.upper() in BOOL_OPS
-
-    for t in tokens:
-        tu = t.upper()
-        if t == "(":
-            stack.append(t)
-        elif t == ")":
-            while stack and stack[-1] != "(":
-                out.append(stack.pop())
-            if stack and stack[-1] == "(":
-                stack.pop()
-        elif is_op(t):
-            # NOT è unario: gestiamo comunque come operatore con precedenza più alta
-            while stack and stack[-1] != "(" and stack[-1].upper() in BOOL_OPS and prec[stack[-1].upper()] >= prec[tu]:
-                out.append(stack.pop())
-            stack.append(tu)
-        else:
-            out.append(t)
-
-    while stack:
-        out.append(stack.pop())
-    return out
-
-def term_query(term: str, fields: List[str]) -> Dict[str, Any]:
-    t = (term or "").strip()
-
-    is_phrase = t.startswith('"') and t.endswith('"') and len(t) >= 2
-    if is_phrase:
-        phrase = t[1:-1].strip()
-        if not phrase:
-            return {"match_all": {}}
-
-        # Phrase match su più campi
-        return {
-            "multi_match": {
-                "query": phrase,
-                "fields": fields,
-                "type": "phrase",
-                "slop": 0,  # metti 1-2 se vuoi tollerare piccole variazioni
-            }
-        }
-
-    # Termine singolo (non tra virgolette)
-    return {
-        "multi_match": {
-            "query": t,
-            "fields": fields,
-            "type": "best_fields",
-            "operator": "and",
-        }
-    }
-
-
-def combine_and(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
-    return {"bool": {"must": [a, b]}}
-
-def combine_or(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
-    return {"bool": {"should": [a, b], "minimum_should_match": 1}}
-
-def apply_not(a: Dict[str, Any]) -> Dict[str, Any]:
-    return {"bool": {"must_not": [a]}}
-
-def rpn_to_es_query(rpn: List[str], fields: List[str]) -> Dict[str, Any]:
-    stack: List[Dict[str, Any]] = []
-    for t in rpn:
-        tu = t.upper()
-        if tu == "NOT":
-            if not stack:
-                continue
-            a = stack.pop()
-            stack.append(apply_not(a))
-        elif tu in ("AND", "OR"):
-            if len(stack) < 2:
-                continue
-            b = stack.pop()
-            a = stack.pop()
-            stack.append(combine_and(a, b) if tu == "AND" else combine_or(a, b))
-        else:
-            stack.append(term_query(t, fields))
-
-    if not stack:
-        # fallback sicuro
-        return {"match_all": {}}
-    # se ci sono più termini senza operatori, comportati come AND
-    q = stack[0]
-    for extra in stack[1:]:
-        q = combine_and(q, extra)
-    return q
-
 # ============================================================
 # STREAMLIT APP
 # ============================================================
@@ -535,14 +358,37 @@ except Exception as e:
     st.error(f"Errore connessione Elasticsearch: {e}")
     st.stop()
 
-paper_title_cache: Dict[str, str] = {}
+# Facet dell'ultima ricerca (aggregazioni nella stessa richiesta, nessuna query extra)
+last_facets = (st.session_state.get("search_results") or {}).get("facets") or {}
+
+
+def facet_select(label: str, name: str, base: Tuple[str, ...] = ()) -> Optional[str]:
+    """Selectbox di una facet con i conteggi dell'ultima ricerca; None = nessun filtro."""
+    counts = dict(last_facets.get(name, []))
+    current = st.session_state.get(f"facet_{name}", "(Tutte)")
+    options = list(dict.fromkeys(["(Tutte)", *base, *counts, current]))
+    value = st.selectbox(
+        label,
+        options,
+        key=f"facet_{name}",
+        format_func=lambda v: f"{v} ({counts[v]})" if v in counts else v,
+    )
+    return None if value == "(Tutte)" else value
+
 
 # Sidebar filters
 with st.sidebar:
     st.header("🔍 Impostazioni ricerca")
 
-    source_sel = st.selectbox("Sorgente", ["(Tutte)", "arxiv", "pmc"], index=0)
-    source_filter = None if source_sel == "(Tutte)" else source_sel
+    source_filter = facet_select("Sorgente", "source", ("arxiv", "pmc"))
+    year_filter = facet_select("Anno", "year")
+    author_filter = facet_select("Autore", "authors")
+    filters = SearchFilters(source=source_filter, date_from=year_filter, date_to=year_filter, author=author_filter)
+    show_facets = st.checkbox(
+        "Conteggi facet",
+        value=False,
+        help="Conteggi per sorgente/anno/autore calcolati nella stessa richiesta della ricerca.",
+    )
 
     st.markdown("---")
     st.subheader("Modalità query")
@@ -559,11 +405,21 @@ with st.sidebar:
         "Full-text": "fulltext",
         "Boolean": "boolean",
     }
+    mode = query_mode_map[query_mode]
     st.markdown("---")
     st.subheader("Risultati")
     #operator = st.selectbox("Operator", ["and", "or"], index=0, help="and = più preciso; or = più recall")
     topk = st.slider("Risultatu", 5, 50, 15)
+    sort_label = st.radio("Ordina per", ["Rilevanza", "Più recenti"], index=0, horizontal=True)
+    sort = {"Rilevanza": "relevance", "Più recenti": "recency"}[sort_label]
     #size_each = st.slider("Cross-search: risultati per indice", 5, 40, 20)
+    budget = st.select_slider(
+        "Budget latenza (ms)",
+        options=["Nessuno", 100, 300, 1000, 3000],
+        value="Nessuno",
+        help="Timeout lato server per ogni indice: mostra i risultati parziali invece di attendere.",
+    )
+    budget_ms = None if budget == "Nessuno" else int(budget)
 
     st.markdown("---")
     st.subheader("Scelta fields ")
@@ -631,9 +487,9 @@ def build_fields(selected: List[str], kind: str) -> List[str]:
     return ["caption^3"]
 
 
-papers_fields = build_fields(paper_fields_sel, "paper")
-tables_fields = build_fields(table_fields_sel, "table")
-figures_fields = build_fields(fig_fields_sel, "figure")
+papers_fields = with_shingles(build_fields(paper_fields_sel, "paper"))
+tables_fields = with_shingles(build_fields(table_fields_sel, "table"))
+figures_fields = with_shingles(build_fields(fig_fields_sel, "figure"))
 
 # Main controls
 query = st.text_input("Query", placeholder="es. entity resolution", value="")
@@ -642,11 +498,21 @@ search_mode = st.radio(
     ["Cross-Search", "Solo Articoli", "Solo Tabelle", "Solo Figure"],
     horizontal=True,
 )
+grouped = search_mode == "Cross-Search" and st.checkbox(
+    "Raggruppa per paper",
+    help="Un risultato per paper con il suo miglior articolo/tabella/figura (campi di default per tipo).",
+)
 
 if not query.strip():
     st.info("Inserisci una query per iniziare.")
     st.stop()
 
+def hits_to_cards(kind: str, hits: List[Dict[str, Any]]) -> List[Tuple[str, float, str, Dict[str, Any]]]:
+    return [(kind, float(h.get("_score") or 0.0), h.get("_id", ""), h.get("_source", {})) for h in hits]
+
+
+# I risultati restano in session_state: i toggle dentro le card (caricamento
+# lazy dei paragrafi) causano un rerun senza ripetere la ricerca.
 if st.button("Cerca"):
     with st.spinner("Ricerca in corso..."):
 
@@ -657,13 +523,18 @@ if st.button("Cerca"):
                 query=query,
                 fields=papers_fields,
                 size=topk,
-                source_filter=source_filter,
-                
+                filters=filters,
+                source_includes=LIST_SOURCE_FIELDS["paper"],
+                mode=mode,
+                sort=sort,
+                budget_ms=budget_ms,
+                facets=show_facets,
             )
+            facets = res.get("facets")
             hits = res.get("hits", {}).get("hits", [])
-            st.success(f"Trovati {len(hits)} articoli.")
-            for h in hits:
-                render_card("paper", float(h.get("_score", 0.0)), h.get("_source", {}), es, paper_title_cache)
+            message = f"Trovati {len(hits)} articoli."
+            cards = hits_to_cards("paper", hits)
+            partial = ["papers"] if res.get("timed_out") else []
 
         elif search_mode == "Solo Tabelle":
             res = es_search_auto(
@@ -672,13 +543,18 @@ if st.button("Cerca"):
                 query=query,
                 fields=tables_fields,
                 size=topk,
-                source_filter=source_filter,
-                
+                filters=filters,
+                source_includes=LIST_SOURCE_FIELDS["table"],
+                mode=mode,
+                sort=sort,
+                budget_ms=budget_ms,
+                facets=show_facets,
             )
+            facets = res.get("facets")
             hits = res.get("hits", {}).get("hits", [])
-            st.success(f"Trovate {len(hits)} tabelle.")
-            for h in hits:
-                render_card("table", float(h.get("_score", 0.0)), h.get("_source", {}), es, paper_title_cache)
+            message = f"Trovate {len(hits)} tabelle."
+            cards = hits_to_cards("table", hits)
+            partial = ["tables"] if res.get("timed_out") else []
 
         elif search_mode == "Solo Figure":
             res = es_search_auto(
@@ -687,61 +563,71 @@ if st.button("Cerca"):
                 query=query,
                 fields=figures_fields,
                 size=topk,
-                source_filter=source_filter,
-                
+                filters=filters,
+                source_includes=LIST_SOURCE_FIELDS["figure"],
+                mode=mode,
+                sort=sort,
+                budget_ms=budget_ms,
+                facets=show_facets,
             )
+            facets = res.get("facets")
             hits = res.get("hits", {}).get("hits", [])
-            st.success(f"Trovate {len(hits)} figure.")
-            for h in hits:
-                render_card("figure", float(h.get("_score", 0.0)), h.get("_source", {}), es, paper_title_cache)
+            message = f"Trovate {len(hits)} figure."
+            cards = hits_to_cards("figure", hits)
+            partial = ["figures"] if res.get("timed_out") else []
+
+        elif grouped:
+            # collapse su paper_id: un gruppo per paper, inner hits = miglior hit per tipo
+            groups = grouped_search(es, query, topk, filters, mode, fuzziness=None, sort=sort, facets=show_facets,
+                                    budget_ms=budget_ms)
+            facets = groups.info.get("facets")
+            cards = [
+                (kind, float(h.get("_score") or 0.0), h.get("_id", ""), h.get("_source", {}))
+                for g in groups
+                for kind in ("paper", "table", "figure")
+                for h in [g["hits"].get(kind)] if h
+            ]
+            partial = ["gruppi"] if groups.info.get("timed_out", {}).get("grouped") else []
+            message = f"Cross-Search raggruppata: {len(groups)} paper, {len(cards)} risultati"
 
         else:
-            papers_res = es_search_auto(
-                es=es,
-                index=INDEX_PAPERS,
-                query=query,
-                fields=papers_fields,
-                size=topk,
-                source_filter=source_filter,
-                
-            )
-            tables_res = es_search_auto(
-                es=es,
-                index=INDEX_TABLES,
-                query=query,
-                fields=tables_fields,
-                size=topk,
-                source_filter=source_filter,
-                
-            )
-            figs_res = es_search_auto(
-                es=es,
-                index=INDEX_FIGURES,
-                query=query,
-                fields=figures_fields,
-                size=topk,
-                source_filter=source_filter,
-                
-            )
-
-            papers_hits = papers_res.get("hits", {}).get("hits", [])
-            tables_hits = tables_res.get("hits", {}).get("hits", [])
-            figs_hits = figs_res.get("hits", {}).get("hits", [])
-
-            merged: List[Tuple[str, float, Dict[str, Any]]] = []
-            for h in papers_hits:
-                merged.append(("paper", float(h.get("_score", 0.0)), h.get("_source", {})))
-            for h in tables_hits:
-                merged.append(("table", float(h.get("_score", 0.0)), h.get("_source", {})))
-            for h in figs_hits:
-                merged.append(("figure", float(h.get("_score", 0.0)), h.get("_source", {})))
-
-            merged.sort(key=lambda x: x[1], reverse=True)
-            merged = merged[:topk]
-
-            st.success(
-                f"Cross-Search: papers={len(papers_hits)}, tables={len(tables_hits)}, figures={len(figs_hits)} → mostrati {len(merged)}"
+            # Cross-Search: un _msearch per round sui 3 indici, stessi tier di search_core.cross_search
+            targets = {
+                "paper": (INDEX_PAPERS, papers_fields, LIST_SOURCE_FIELDS["paper"]),
+                "table": (INDEX_TABLES, tables_fields, LIST_SOURCE_FIELDS["table"]),
+                "figure": (INDEX_FIGURES, figures_fields, LIST_SOURCE_FIELDS["figure"]),
+            }
+            plan = search_plan(query, targets, topk, filters, mode,
+                               fuzziness=None, sort=sort, budget_ms=budget_ms, facets=show_facets)
+            responses, info = run_plan(es, plan, budget_ms=budget_ms)
+            facets = info.get("facets")
+            partial = [f"{kind}s" for kind, flag in info["timed_out"].items() if flag]
+            hits_by_kind = {kind: r.get("hits", {}).get("hits", []) for kind, r in responses.items()}
+            papers_hits, tables_hits, figs_hits = (hits_by_kind[k] for k in ("paper", "table", "figure"))
+
+            # fusione per rank (config.CROSS_FUSION): gli score BM25 dei 3 indici non sono confrontabili
+            merged = merge_by_recency(hits_by_kind) if sort == "recency" else fuse_hits(hits_by_kind)
+            cards = [(kind, sc, h.get("_id", ""), h.get("_source", {})) for kind, sc, h in merged[:topk]]
+
+            message = (
+                f"Cross-Search: papers={len(papers_hits)}, tables={len(tables_hits)}, figures={len(figs_hits)} → mostrati {len(cards)}"
             )
 
-            for kind, sc, src in merged:
-                render_card(kind, sc, src, es, paper_title_cache)
+    st.session_state["search_results"] = {
+        "query": query, "message": message, "cards": cards, "partial": partial, "facets": facets,
+    }
+    # rerun: la sidebar (disegnata prima della ricerca) mostra subito i conteggi nuovi
+    st.rerun()
+
+results = st.session_state.get("search_results")
+if results and results["query"] == query:
+    st.success(results["message"])
+    if results.get("partial"):
+        st.warning(f"Risultati parziali (budget di latenza superato): {', '.join(results['partial'])}")
+    # paper_title e' denormalizzato in tables/figures; fallback (un solo mget) per doc indicizzati prima
+    paper_titles = resolve_paper_titles(es, [
+        src.get("paper_id") or "" for kind, _, _, src in results["cards"]
+        if kind in ("table", "figure") and not src.get("paper_title")
+    ])
+    for kind, sc, doc_id, src in results["cards"]:
+        render_card(kind, sc, src, es, paper_titles, doc_id=doc_id)
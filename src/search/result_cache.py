@@ -0,0 +1,166 @@
+# src/search/result_cache.py
+"""
+Cache dei risultati di ricerca per search_core.
+
+- tier 1: LRU in-process (OrderedDict) con TTL, hit in microsecondi;
+- tier 2 (opzionale): SQLite su disco, condiviso tra processi (Streamlit, CLI, eval).
+
+La chiave include la "generazione" dell'indice (uuid degli indici concreti dietro
+nome/alias + token _meta.cache_generation del mapping): ricreare un indice invalida da
+sola le voci, una reindicizzazione le invalida con bump_generation (chiamata dall'indexer).
+Refresh e conteggi doc che cambiano durante l'indicizzazione non toccano la cache.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+GENERATION_META = "cache_generation"
+
+
+def make_key(index: str, generation: str, body: Dict[str, Any]) -> str:
+    payload = json.dumps([index, generation, body], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, disk_path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path is not None:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False, timeout=5)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, expires REAL, value TEXT)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > now:
+                    self._mem.move_to_end(key)
+                    # copia: fusione/rerank annotano gli hit
+                    return copy.deepcopy(value)
+                del self._mem[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT expires, value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] <= now:
+                return None
+            value = json.loads(row[1])
+            self._remember(key, row[0], value)
+            return copy.deepcopy(value)
+
+    def put(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, expires, value) VALUES (?, ?, ?)",
+                    (key, expires, json.dumps(value, ensure_ascii=False, default=str)),
+                )
+                self._db.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+                self._db.commit()
+
+    def _remember(self, key: str, expires: float, value: Any) -> None:
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+
+def bump_generation(es, indices: Iterable[str]) -> None:
+    """
+    Nuova generazione per `indices` (nomi fisici o alias) nel _meta del mapping: le voci
+    in cache per quegli indici scadono in ogni processo entro GenerationTracker.check_every.
+    L'indexer la chiama dopo il refresh finale, quando le modifiche sono visibili.
+    """
+    indices = sorted(set(indices))
+    if indices:
+        es.indices.put_mapping(index=indices, meta={GENERATION_META: str(time.time_ns())})
+
+
+class GenerationTracker:
+    """
+    Token di generazione per nome indice/alias, ricontrollato al piu' ogni `check_every` secondi.
+    I nomi da ricontrollare si leggono con una sola chiamata (get_many): una cross-search a
+    freddo paga un round trip di metadati, non uno per indice.
+    """
+
+    def __init__(self, check_every: float = 5):
+        self.check_every = check_every
+        self._seen: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, es, index: str) -> Optional[str]:
+        return self.get_many(es, [index])[index]
+
+    def get_many(self, es, names: List[str]) -> Dict[str, Optional[str]]:
+        now = time.time()
+        out: Dict[str, Optional[str]] = {}
+        stale = []
+        with self._lock:
+            for name in dict.fromkeys(names):
+                item = self._seen.get(name)
+                if item is not None and now - item[0] < self.check_every:
+                    out[name] = item[1]
+                else:
+                    stale.append(name)
+        if stale:
+            tokens = self._fetch(es, stale)
+            with self._lock:
+                for name in stale:
+                    self._seen[name] = (now, tokens.get(name))
+                    out[name] = tokens.get(name)
+        return out
+
+    @staticmethod
+    def _fetch(es, names: List[str]) -> Dict[str, Optional[str]]:
+        """{nome: token}; un nome puo' essere "a,b" (ricerca su piu' indici) o un alias."""
+        parts = sorted({p for name in names for p in name.split(",") if p})
+        try:
+            res = es.indices.get(
+                index=parts,
+                ignore_unavailable=True,
+                filter_path=["*.aliases", "*.settings.index.uuid", f"*.mappings._meta.{GENERATION_META}"],
+            )
+        except Exception:
+            return {}  # niente generazione -> niente cache
+        res = res.body if hasattr(res, "body") else res
+
+        def concrete(part: str) -> List[str]:
+            return sorted(
+                f"{name}:{(info.get('settings') or {}).get('index', {}).get('uuid')}:"
+                f"{((info.get('mappings') or {}).get('_meta') or {}).get(GENERATION_META, '')}"
+                for name, info in (res or {}).items()
+                if name == part or part in (info.get("aliases") or {})
+            )
+
+        tokens: Dict[str, Optional[str]] = {}
+        for name in names:
+            found = [concrete(p) for p in name.split(",") if p]
+            # un indice/alias mancante: nessuna cache per quel nome
+            tokens[name] = "|".join(t for ts in found for t in ts) if found and all(found) else None
+        return tokens
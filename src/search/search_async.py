@@ -0,0 +1,182 @@
+# src/search/search_async.py
+"""
+Versione asincrona di search_index / cross_search su AsyncElasticsearch.
+
+Sequenza delle ricerche, rerank e fusione sono gli stessi di search_core (search_plan,
+cross_targets, merge_cross_hits): l'API sync resta un sottile wrapper sugli stessi
+builder, qui cambia solo il trasporto.
+
+- un client condiviso per event loop (pool di connessioni aiohttp);
+- fan-out concorrente delle sotto-ricerche con timeout per chiamata;
+- la cancellazione del task chiamante annulla anche le richieste HTTP in volo.
+"""
+from __future__ import annotations
+
+import asyncio
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import ConnectionTimeout
+
+from src.config import ES_HOST, INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES, ASYNC_ES_CONNECTIONS, SEARCH_BUDGET_MS
+from src.search.search_core import (
+    CrossResults,
+    SearchFilters,
+    budget_timeout,
+    cross_targets,
+    merge_cross_hits,
+    normalize_query,
+    search_plan,
+)
+
+# chiave = il loop stesso, non id(loop): un id riciclato restituirebbe un client di un loop chiuso
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncElasticsearch]" = weakref.WeakKeyDictionary()
+
+
+def async_es_client() -> AsyncElasticsearch:
+    """Client condiviso per l'event loop corrente (il pool aiohttp e' legato al loop)."""
+    loop = asyncio.get_running_loop()
+    # il client tiene un riferimento al suo loop, quindi la weakref da sola non basta:
+    # i client dei loop gia' chiusi (senza close_async_client) si scartano qui
+    for dead in [l for l in list(_CLIENTS) if l.is_closed()]:
+        _CLIENTS.pop(dead, None)
+    es = _CLIENTS.get(loop)
+    if es is None:
+        es = AsyncElasticsearch(ES_HOST, request_timeout=60, connections_per_node=ASYNC_ES_CONNECTIONS)
+        _CLIENTS[loop] = es
+    return es
+
+
+async def close_async_client() -> None:
+    es = _CLIENTS.pop(asyncio.get_running_loop(), None)
+    if es is not None:
+        await es.close()
+
+
+async def arun_plan(es: AsyncElasticsearch, plan, timeout: Optional[float] = None, raise_errors: bool = False):
+    """
+    Esegue search_core.search_plan: le ricerche di ogni round partono in concorrenza.
+    Una ricerca che supera il timeout (o fallisce) risponde vuota, salvo raise_errors;
+    se e' un timeout la risposta vuota ha timed_out (come un timeout lato server).
+    """
+    client = es.options(request_timeout=timeout) if timeout else es
+
+    async def one(index: str, body: Dict[str, Any]):
+        # con le facet anche la shard request cache, come search_core.run_search
+        coro = client.search(index=index, body=body, request_cache=True if "aggs" in body else None)
+        res = await (asyncio.wait_for(coro, timeout) if timeout else coro)
+        return res.body if hasattr(res, "body") else res
+
+    try:
+        reqs = next(plan)
+        while True:
+            results = await asyncio.gather(*(one(index, body) for _, index, body in reqs), return_exceptions=True)
+            responses: Dict[str, Dict[str, Any]] = {}
+            for (key, index, _), r in zip(reqs, results):
+                if isinstance(r, asyncio.CancelledError) or (raise_errors and isinstance(r, BaseException)):
+                    raise r
+                if isinstance(r, (asyncio.TimeoutError, ConnectionTimeout)):
+                    r = {"hits": {"hits": []}, "timed_out": True}
+                elif isinstance(r, BaseException):
+                    print(f"[WARN] ricerca async su {index} fallita: {r!r}")
+                    r = {"hits": {"hits": []}}
+                responses[key] = r
+            reqs = plan.send(responses)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def asearch_index(
+    es: AsyncElasticsearch,
+    index: str,
+    query: str,
+    fields: List[str],
+    topk: int = 20,
+    filters: Optional[SearchFilters] = None,
+    source_includes: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    mode: str = "auto",
+    sort: str = "relevance",
+    tiered: Optional[bool] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+    facets: bool = False,
+) -> Dict[str, Any]:
+    """
+    Come search_core.search_index (tier, fuzziness adattiva). timeout (secondi) vale per ogni
+    chiamata: allo scadere la richiesta viene annullata e si propaga asyncio.TimeoutError.
+    Con budget_ms invece il risultato torna parziale con res["timed_out"]; facets -> res["facets"].
+    """
+    query = normalize_query(query)
+    if not query:
+        return {"hits": {"hits": []}}
+
+    plan = search_plan(query, {"main": (index, fields, source_includes)}, topk, filters, mode,
+                       sort=sort, tiered=tiered, budget_ms=budget_ms, facets=facets)
+    if budget_ms:
+        responses, info = await arun_plan(es, plan, timeout or budget_timeout(budget_ms))
+    else:
+        responses, info = await arun_plan(es, plan, timeout, raise_errors=True)
+    res = {**responses["main"], "tier": info["tiers"]["main"], "path": info["paths"]["main"],
+           "timed_out": info["timed_out"]["main"]}
+    if "main" in info["corrected"]:
+        res["corrected_query"] = info["corrected"]["main"]
+    if facets:
+        res["facets"] = info["facets"]
+    return res
+
+
+async def across_search(
+    es: AsyncElasticsearch,
+    query: str,
+    index_papers: str = INDEX_PAPERS,
+    index_tables: str = INDEX_TABLES,
+    index_figures: str = INDEX_FIGURES,
+    size_each: int = 20,
+    size_total: int = 20,
+    filters: Optional[SearchFilters] = None,
+    mode="auto",
+    rerank: Optional[bool] = None,
+    source_fields: Optional[Dict[str, List[str]]] = None,
+    fusion: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    timeout: Optional[float] = None,
+    sort: str = "relevance",
+    tiered: Optional[bool] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+    facets: bool = False,
+) -> CrossResults:
+    """
+    Come search_core.cross_search, ma le sotto-ricerche (di ogni round) partono in concorrenza.
+    Un indice che supera il timeout (o fallisce) contribuisce con una lista vuota.
+    budget_ms: come in cross_search; senza timeout esplicito anche il client si ferma al budget.
+    facets: info["facets"] come in cross_search.
+    """
+    q = normalize_query(query)
+    if not q:
+        return CrossResults()
+
+    targets = cross_targets(index_papers, index_tables, index_figures, source_fields)
+    plan = search_plan(q, targets, size_each, filters, mode, sort=sort, tiered=tiered, budget_ms=budget_ms,
+                       facets=facets)
+    responses, info = await arun_plan(es, plan, timeout or (budget_timeout(budget_ms) if budget_ms else None))
+    hits_by_kind = {kind: r.get("hits", {}).get("hits", []) for kind, r in responses.items()}
+    merged = merge_cross_hits(q, hits_by_kind, size_total, rerank, fusion, weights, sort)
+    return CrossResults(merged, info=info)
+
+
+async def across_search_many(
+    queries: Iterable[str],
+    concurrency: int = 8,
+    es: Optional[AsyncElasticsearch] = None,
+    **kwargs,
+) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+    """Esegue molte cross-search (es. loop di valutazione) con al piu' `concurrency` in volo."""
+    es = es or async_es_client()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(q: str):
+        async with sem:
+            return await across_search(es, q, **kwargs)
+
+    return list(await asyncio.gather(*(run(q) for q in queries)))
@@ -2,63 +2,71 @@ import argparse
 import sys
 import json
 
-from .search_core import es_client, cross_search, SearchFilters
-from ..config import INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES
-
-def get_paper_title_cached(es, paper_doc_id: str, cache: dict, index_papers: str) -> str:
-    """
-    paper_doc_id per tables/figures: "<source>_<paper_id>".
-    Prova:
-      1) GET per _id
-      2) fallback: term query su campo paper_id
-    """
-    if not paper_doc_id:
-        return ""
-    if paper_doc_id in cache:
-        return cache[paper_doc_id]
-
-    title = ""
-
-    # (1) try by _id
-    try:
-        doc = es.get(index=index_papers, id=paper_doc_id, request_timeout=10)
-        src = doc.get("_source", {}) if isinstance(doc, dict) else {}
-        title = (src.get("title") or "").strip()
-    except Exception:
-        pass
-
-    # (2) fallback: term on paper_id
-    if not title:
-        try:
-            res = es.search(
-                index=index_papers,
-                body={
-                    "size": 1,
-                    "_source": ["title"],
-                    "query": {"term": {"paper_id": paper_doc_id}},
-                },
-                request_timeout=10,
-            )
-            hits = res.get("hits", {}).get("hits", [])
-            if hits:
-                title = (hits[0].get("_source", {}).get("title") or "").strip()
-        except Exception:
-            pass
-
-    cache[paper_doc_id] = title
-    return title
+from .search_core import es_client, cross_search, grouped_search, resolve_paper_titles, SearchFilters, FUSION_STRATEGIES, QUERY_MODES, SORT_MODES
+from ..config import INDEX_PAPERS, INDEX_TABLES, INDEX_FIGURES, INDEX_SOURCES, SEARCH_BUDGET_MS
+
+def print_groups(groups, query: str, raw: bool):
+    if raw:
+        print(json.dumps([
+            {
+                "paper_id": g["paper_id"],
+                "score": g["score"],
+                "hits": {kind: {"id": h.get("_id"), "score": h.get("_score")} for kind, h in g["hits"].items()},
+            }
+            for g in groups
+        ], indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n--- Grouped Results for: '{query}' ---\n")
+    if groups.info.get("timed_out", {}).get("grouped"):
+        print("Partial results (budget exceeded)\n")
+    if not groups:
+        print("No results found.")
+        return
+    for i, g in enumerate(groups, start=1):
+        srcs = {kind: h.get("_source", {}) or {} for kind, h in g["hits"].items()}
+        title = (srcs.get("paper", {}).get("title") or next(
+            (s.get("paper_title") for s in srcs.values() if s.get("paper_title")), "") or "(no title)").strip()
+        print(f"{i:2d}. {title}  [{g['paper_id']}] (Score: {g['score']:.4f})")
+        for kind in ("paper", "table", "figure"):
+            h = g["hits"].get(kind)
+            if not h:
+                continue
+            src = srcs[kind]
+            label = src.get("table_id") or src.get("figure_id") or src.get("date") or ""
+            text = (src.get("caption") or src.get("abstract") or "").strip().replace("\n", " ")
+            print(f"    - {kind:<6} {label:<10} {text[:90]}{'...' if len(text) > 90 else ''}")
+        print()
+
+
+def print_facets(facets):
+    print("Facets:")
+    for name, buckets in facets.items():
+        print(f"  {name:<8} " + (", ".join(f"{value} ({count})" for value, count in buckets) or "-"))
+
 
 def main():
     parser = argparse.ArgumentParser(description="Search Engine CLI (Paper, Table, Figure)")
 
     parser.add_argument("query", type=str, help="Search query (supports boolean syntax)")
     parser.add_argument("--limit", type=int, default=15, help="Total results to show")
-    parser.add_argument("--source", type=str, choices=["arxiv", "pmc"], help="Filter by source")
+    parser.add_argument("--source", type=str, choices=INDEX_SOURCES, help="Filter by source")
     parser.add_argument("--from-date", type=str, help="Filter from date (YYYY-MM-DD or YYYY)")
     parser.add_argument("--to-date", type=str, help="Filter to date (YYYY-MM-DD or YYYY)")
+    parser.add_argument("--author", type=str, help="Filter by exact author name (authors.keyword)")
+    parser.add_argument("--mode", type=str, choices=QUERY_MODES, default="auto", help="Query mode: auto detects AND/OR/NOT and parentheses")
+    parser.add_argument("--sort", type=str, choices=SORT_MODES, default="relevance", help="relevance (fused ranks) or recency (newest first)")
+    parser.add_argument("--fusion", type=str, choices=FUSION_STRATEGIES, help="Cross-index fusion strategy (default: config.CROSS_FUSION)")
+    parser.add_argument("--budget-ms", type=int, default=SEARCH_BUDGET_MS, help="Latency budget per sub-search (server timeout + terminate_after); partial results are flagged")
+    parser.add_argument("--grouped", action="store_true", help="One result per paper (collapse on paper_id) with its best paper/table/figure hits")
+    parser.add_argument("--tiers", action=argparse.BooleanOptionalAction, default=None,
+                        help="Short fields first, full_text only on shortfall (default: config.TIERED_SEARCH)")
+    parser.add_argument("--facets", action="store_true", help="Also show source/author/year counts (aggregations in the same request)")
     parser.add_argument("--raw", action="store_true", help="Output raw JSON")
 
     args = parser.parse_args()
+    if args.grouped and args.tiers:
+        parser.error("--grouped searches all fields in a single request (no tiers)")
 
     # 1) Setup client
     try:
@@ -70,16 +78,27 @@ def main():
         print(f"Connection Error: {e}")
         sys.exit(1)
 
-    paper_title_cache = {}
 
     # 2) Setup filters
     filters = SearchFilters(
         source=args.source,
         date_from=args.from_date,
         date_to=args.to_date,
+        author=args.author,
     )
 
     # 3) Execute search
+    if args.grouped:
+        groups = grouped_search(es, args.query, size=args.limit, filters=filters, mode=args.mode, sort=args.sort,
+                                facets=args.facets, fusion=args.fusion, budget_ms=args.budget_ms)
+        print_groups(groups, args.query, args.raw)
+        if "facets" in groups.info:
+            if args.raw:
+                print(json.dumps({"facets": groups.info["facets"]}, indent=2, ensure_ascii=False))
+            else:
+                print_facets(groups.info["facets"])
+        return
+
     results = cross_search(
         es,
         args.query,
@@ -89,6 +108,12 @@ def main():
         size_each=20,          # candidati per tipo
         size_total=args.limit,
         filters=filters,
+        mode=args.mode,
+        fusion=args.fusion,
+        sort=args.sort,
+        tiered=args.tiers,
+        budget_ms=args.budget_ms,
+        facets=args.facets,
     )
 
     # 4) Print results
@@ -99,20 +124,41 @@ def main():
             out.append({
                 "type": kind,
                 "score": score,
+                "rank_by_list": {k: v["rank"] for k, v in hit.get("_fusion", {}).get("lists", {}).items()},
                 "id": hit.get("_id"),
                 "source": src.get("source"),
                 "title": src.get("title") or src.get("caption"),
                 "date": src.get("date"),
             })
-        print(json.dumps(out, indent=2, ensure_ascii=False))
+        if "facets" in results.info:
+            print(json.dumps({"results": out, "facets": results.info["facets"]}, indent=2, ensure_ascii=False))
+        else:
+            print(json.dumps(out, indent=2, ensure_ascii=False))
         return
 
-    print(f"\n--- Search Results for: '{args.query}' ---\n")
+    print(f"\n--- Search Results for: '{args.query}' ---")
+    info = results.info
+    print("Path:  " + ", ".join(f"{kind}=tier{tier}/{info['paths'][kind]}" for kind, tier in info["tiers"].items()))
+    partial = [kind for kind, flag in info["timed_out"].items() if flag]
+    if partial:
+        print(f"Partial results (budget exceeded): {', '.join(partial)}")
+    for kind, corrected in info["corrected"].items():
+        print(f"Did you mean ({kind}): {corrected}")
+    if "facets" in info:
+        print_facets(info["facets"])
+    print()
 
     if not results:
         print("No results found.")
         return
 
+    # paper_title e' denormalizzato in tables/figures; un solo mget solo per doc vecchi che non lo hanno
+    paper_titles = resolve_paper_titles(es, [
+        (hit.get("_source", {}) or {}).get("paper_id") or ""
+        for kind, _, hit in results
+        if kind in ("table", "figure") and not (hit.get("_source", {}) or {}).get("paper_title")
+    ], INDEX_PAPERS)
+
     for i, (kind, score, hit) in enumerate(results, start=1):
         src = hit.get("_source", {}) or {}
 
@@ -122,7 +168,7 @@ def main():
 
         if kind in ("table", "figure"):
             paper_doc_id = (src.get("paper_id") or "").strip()  # per tables/figures è <source>_<paper_id>
-            paper_title = get_paper_title_cached(es, paper_doc_id, paper_title_cache, INDEX_PAPERS)
+            paper_title = (src.get("paper_title") or "").strip() or paper_titles.get(paper_doc_id, "")
             if paper_title:
                 title = paper_title
             else:
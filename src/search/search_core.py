@@ -3,11 +3,105 @@
 # src/search_core.py
 from __future__ import annotations
 
-from dataclasses import dataclass
+import copy
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import Optional, List, Dict, Any, Tuple
 from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ConnectionTimeout
 
-from src.config import ES_HOST
+from src.config import (
+    ES_HOST,
+    INDEX_PAPERS,
+    INDEX_PARAGRAPHS,
+    INDEX_TABLES,
+    INDEX_FIGURES,
+    HYBRID_ALPHA,
+    HYBRID_RERANK_TOP_N,
+    HYBRID_RERANK_ENABLED,
+    RRF_K,
+    CROSS_FUSION,
+    FUSION_WEIGHTS,
+    SEARCH_CACHE_ENABLED,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_DISK,
+    SEARCH_CACHE_GENERATION_CHECK,
+    SEARCH_CACHE_PATH,
+    QUERY_COMPILE_CACHE_SIZE,
+    PAPER_TITLE_CACHE_SIZE,
+    PAPER_TITLE_CACHE_TTL,
+    ROUTE_OBJECTS_BY_PAPER,
+    SPLIT_INDICES_BY_SOURCE,
+    INDEX_SOURCES,
+    TIERED_SEARCH,
+    TIER1_SKIP_FIELDS,
+    ADAPTIVE_FUZZINESS,
+    FUZZY_MIN_HITS,
+    SEARCH_BUDGET_MS,
+    BUDGET_TERMINATE_AFTER,
+    BUDGET_CLIENT_GRACE,
+    FACET_SIZE,
+    GROUPED_CANDIDATES,
+)
+from src.search.result_cache import ResultCache, GenerationTracker, make_key
+from src.utils import physical_index, id_source
+
+KIND_INDEX = {"paper": INDEX_PAPERS, "table": INDEX_TABLES, "figure": INDEX_FIGURES}
+
+# Campi di ricerca di default per tipo di oggetto.
+# *.shingles (mapping "slim"): premia i termini adiacenti; su indici "legacy" il subfield
+# non esiste e multi_match lo ignora.
+DEFAULT_FIELDS = {
+    "paper": ["title^3", "title.shingles^3", "abstract^2", "abstract.shingles^2", "full_text"],
+    "table": ["caption^3", "caption.shingles^3", "body^2", "mentions", "context_paragraphs"],
+    "figure": ["caption^3", "caption.shingles^3", "mentions", "context_paragraphs"],
+}
+
+SHINGLED_FIELDS = ("title", "abstract", "caption", "paper_title")
+
+
+def tier1_fields(fields: List[str]) -> List[str]:
+    """Campi del primo tier: senza quelli costosi (TIER1_SKIP_FIELDS, anche con boost/subfield)."""
+    return [f for f in fields if f.partition("^")[0].split(".")[0] not in TIER1_SKIP_FIELDS]
+
+
+def with_shingles(fields: List[str]) -> List[str]:
+    """Aggiunge il subfield .shingles (stesso boost) ai campi corti che lo hanno nel mapping "slim"."""
+    out = list(fields)
+    for f in fields:
+        name, _, boost = f.partition("^")
+        if name in SHINGLED_FIELDS:
+            out.append(f"{name}.shingles" + (f"^{boost}" if boost else ""))
+    return out
+
+
+# _source per le liste di risultati: solo cio' che la card/riga mostra.
+# full_text, body, table_html e vettori si caricano con get_details().
+LIST_SOURCE_FIELDS = {
+    "paper": ["paper_id", "source", "title", "authors", "date", "abstract", "url", "doc_url"],
+    "table": ["paper_id", "paper_title", "authors", "table_id", "source", "date", "caption", "url", "doc_url",
+              "mention_refs", "context_refs"],
+    "figure": ["paper_id", "paper_title", "authors", "figure_id", "source", "date", "caption", "figure_url",
+               "url", "doc_url", "mention_refs", "context_refs"],
+}
+
+# Solo gli identificativi (valutazione: ranking senza payload)
+ID_SOURCE_FIELDS = {
+    "paper": ["paper_id"],
+    "table": ["paper_id", "table_id"],
+    "figure": ["paper_id", "figure_id"],
+}
+
+# Campi pesanti per la vista di dettaglio
+DETAIL_SOURCE_FIELDS = {
+    "paper": ["full_text"],
+    "table": ["body", "table_html"],
+    "figure": [],
+}
 
 
 @dataclass
@@ -15,6 +109,7 @@ class SearchFilters:
     source: Optional[str] = None        # "arxiv" | "pmc" | None
     date_from: Optional[str] = None     # "YYYY-MM-DD" or "YYYY"
     date_to: Optional[str] = None       # "YYYY-MM-DD" or "YYYY"
+    author: Optional[str] = None        # valore esatto di authors.keyword (facet autori)
 
 
 def _build_filters(filters: Optional[SearchFilters]) -> List[Dict[str, Any]]:
@@ -34,113 +129,200 @@ def _build_filters(filters: Optional[SearchFilters]) -> List[Dict[str, Any]]:
             rng["lte"] = filters.date_to
         flt.append({"range": {"date": rng}})
 
+    if filters.author:
+        flt.append({"term": {"authors.keyword": filters.author}})
+
     return flt
 
 
-def search_index(
-    es: Elasticsearch,
-    index: str,
-    query: str,
-    fields: List[str],
-    topk: int = 20,
-    filters: Optional[SearchFilters] = None,
-) -> Dict[str, Any]:
+FACETS = ("source", "authors", "year")
+
+
+def facet_aggs(size: int = FACET_SIZE) -> Dict[str, Any]:
+    """Aggregazioni delle facet, comuni a papers/tables/figures (source, autori, anno)."""
+    return {
+        "source": {"terms": {"field": "source", "size": size}},
+        "authors": {"terms": {"field": "authors.keyword", "size": size}},
+        "year": {"date_histogram": {"field": "date", "calendar_interval": "year", "format": "yyyy", "min_doc_count": 1}},
+    }
+
+
+def merge_facets(responses: List[Dict[str, Any]], size: int = FACET_SIZE) -> Dict[str, List[Tuple[str, int]]]:
     """
-    Ricerca SOLO con Elasticsearch multi_match (niente query_string/Lucene).
-    fields può includere boost con ^ (es: "title^3").
+    Somma i bucket di facet_aggs di piu' risposte (una per tipo in cross_search):
+    {"source"|"authors": [(valore, doc)] per frequenza, "year": [(anno, doc)] dal piu' recente}.
     """
-    query = (query or "").strip()
-    if not query:
-        return {"hits": {"hits": []}}
+    out: Dict[str, List[Tuple[str, int]]] = {}
+    for name in FACETS:
+        counts: Counter = Counter()
+        for r in responses:
+            for b in ((r.get("aggregations") or {}).get(name) or {}).get("buckets", []):
+                counts[str(b.get("key_as_string", b["key"]))] += b["doc_count"]
+        out[name] = sorted(counts.items(), reverse=True) if name == "year" else counts.most_common(size)
+    return out
 
-    body = {
-        "size": topk,
-        "query": {
-            "bool": {
-                "must": [
-                    {
-                        "multi_match": {
-                            "query": query,
-                            "fields": fields,
-                            "type": "best_fields",
-                            "operator": "and",
-                            "fuzziness": "AUTO",  # aiuta typo leggeri
-                        }
-                    }
-                ],
-                "filter": _build_filters(filters),
-            }
-        },
-    }
 
-    return es.search(index=index, body=body, request_timeout=30)
+def scoped_index(index: str, filters: Optional[SearchFilters]) -> Tuple[str, Optional[SearchFilters]]:
+    """
+    Con SPLIT_INDICES_BY_SOURCE il filtro source diventa la scelta dell'indice fisico
+    (hw5_papers + source="pmc" -> hw5_papers_pmc, senza term filter); altrimenti invariati.
+    """
+    if (SPLIT_INDICES_BY_SOURCE and filters and filters.source in INDEX_SOURCES
+            and index in KIND_INDEX.values()):
+        return physical_index(index, filters.source), replace(filters, source=None)
+    return index, filters
 
 
-def cross_search(
+_RESULT_CACHE = ResultCache(
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_PATH if SEARCH_CACHE_DISK else None,
+)
+_GENERATIONS = GenerationTracker(SEARCH_CACHE_GENERATION_CHECK)
+# paper _id -> titolo ("" = non trovato), condiviso da CLI e app
+_TITLE_CACHE = ResultCache(PAPER_TITLE_CACHE_SIZE, PAPER_TITLE_CACHE_TTL)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").split())
+
+
+# parametri del budget (search_plan.budgeted): timeout cambia a ogni richiesta, fuori dalla chiave
+BUDGET_KEYS = ("timeout", "terminate_after")
+
+
+def _cache_keys(es: Elasticsearch, requests: List[Tuple[str, Dict[str, Any]]], use_cache: bool) -> List[Optional[str]]:
+    """Chiavi di cache per (index, body); le generazioni di tutti gli indici in una sola chiamata."""
+    if not (use_cache and SEARCH_CACHE_ENABLED):
+        return [None] * len(requests)
+    generations = _GENERATIONS.get_many(es, [index for index, _ in requests])
+    return [
+        make_key(index, generations[index], {k: v for k, v in body.items() if k not in BUDGET_KEYS})
+        if generations.get(index) else None
+        for index, body in requests
+    ]
+
+
+def _as_dict(res: Any) -> Dict[str, Any]:
+    return res.body if hasattr(res, "body") else res
+
+
+def is_partial(res: Dict[str, Any]) -> bool:
+    """Risposta troncata dal budget (timeout lato server o terminate_after): non va in cache."""
+    return bool(res.get("timed_out") or res.get("terminated_early"))
+
+
+def clear_search_cache() -> None:
+    _RESULT_CACHE.clear()
+
+
+def run_search(
     es: Elasticsearch,
-    query: str,
-    index_papers: str,
-    index_tables: str,
-    index_figures: str,
-    size_each: int = 20,
-    size_total: int = 20,
-    filters: Optional[SearchFilters] = None,
-    mode="auto"
-) -> List[Tuple[str, float, Dict[str, Any]]]:
+    index: str,
+    body: Dict[str, Any],
+    use_cache: bool = True,
+    request_timeout: float = 30,
+) -> Dict[str, Any]:
+    """es.search con la cache dei risultati (chiave = indice, generazione, body)."""
+    key = _cache_keys(es, [(index, body)], use_cache)[0]
+    if key:
+        cached = _RESULT_CACHE.get(key)
+        if cached is not None:
+            return cached
+    # con le aggregazioni anche la shard request cache (di default ES la usa solo con size=0)
+    res = _as_dict(es.search(index=index, body=body, request_timeout=request_timeout,
+                             request_cache=True if "aggs" in body else None))
+    if key and not is_partial(res):
+        _RESULT_CACHE.put(key, res)
+    return res
+
+
+# ============================================================
+# BOOLEAN QUERY COMPILER (condiviso da CLI, UI ed eval)
+# ============================================================
+BOOL_OPS = {"AND", "OR", "NOT"}
+QUERY_MODES = ("auto", "fulltext", "boolean")
+
+# termini "semplici" (una sola parola): si possono fondere in un unico multi_match
+_SIMPLE_TERM_RE = re.compile(r"\w+")
+
+
+def looks_boolean(q: str) -> bool:
+    if not q:
+        return False
+    # basta che contenga AND/OR/NOT come token oppure parentesi
+    return bool(re.search(r"\b(AND|OR|NOT)\b", q, flags=re.IGNORECASE)) or ("(" in q) or (")" in q)
+
+
+def tokenize_boolean(q: str) -> List[str]:
     """
-    Cross-search semplice:
-    - esegue 3 ricerche separate (papers/tables/figures)
-    - fonde i risultati ordinando per score normalizzato (semplice, non RRF puro)
-    Ritorna lista di (kind, score, hit)
+    Tokenizza:
+      - "frasi tra virgolette"
+      - AND/OR/NOT
+      - parentesi
+      - parole/termini
     """
-    q = (query or "").strip()
-    if not q:
-        return []
+    tokens = []
+    i = 0
+    n = len(q)
+    while i < n:
+        c = q[i]
+        if c.isspace():
+            i += 1
+            continue
+        if c in "()":
+            tokens.append(c)
+            i += 1
+            continue
+        if c == '"':
+            j = i + 1
+            while j < n and q[j] != '"':
+                j += 1
+            phrase = q[i+1:j] if j < n else q[i+1:]
+            tokens.append(f'"{phrase}"')
+            i = j + 1 if j < n else n
+            continue
 
-    papers = search_index(
-        es, index_papers, q,
-        fields=["title^3", "abstract^2", "full_text"],
-        topk=size_each,
-        filters=filters,
-    ).get("hits", {}).get("hits", [])
-
-    tables = search_index(
-        es, index_tables, q,
-        fields=["caption^3", "body^2", "mentions", "context_paragraphs"],
-        topk=size_each,
-        filters=filters,
-    ).get("hits", {}).get("hits", [])
-
-    figures = search_index(
-        es, index_figures, q,
-        fields=["caption^3", "mentions", "context_paragraphs"],
-        topk=size_each,
-        filters=filters,
-    ).get("hits", {}).get("hits", [])
-
-    # normalizza score per ciascuna lista (evita che un indice domini)
-    def norm(hits):
-        if not hits:
-            return []
-        mx = max((h.get("_score") or 0.0) for h in hits) or 1.0
-        out = []
-        for h in hits:
-            out.append((h, float(h.get("_score") or 0.0) / mx))
-        return out
+        # parola / operatore
+        j = i
+        while j < n and (not q[j].isspace()) and q[j] not in "()":
+            j += 1
+        tokens.append(q[i:j])
+        i = j
+    return tokens
 
-    merged: List[Tuple[str, float, Dict[str, Any]]] = []
 
-    for h, s in norm(papers):
-        merged.append(("paper", s, h))
-    for h, s in norm(tables):
-        merged.append(("table", s, h))
-    for h, s in norm(figures):
-        merged.append(("figure", s, h))
+def to_rpn(tokens: List[str]) -> List[str]:
+    """
+    Shunting-yard: NOT > AND > OR
+    """
+    prec = {"NOT": 3, "AND": 2, "OR": 1}
+    out = []
+    stack = []
 
-    merged.sort(key=lambda x: x[1], reverse=True)
-    return merged[:size_total]
+    for t in tokens:
+        tu = t.upper()
+        if t == "(":
+            stack.append(t)
+        elif t == ")":
+            while stack and stack[-1] != "(":
+                out.append(stack.pop())
+            if stack and stack[-1] == "(":
+                stack.pop()
+        elif tu in BOOL_OPS:
+            # NOT è unario: gestiamo comunque come operatore con precedenza più alta
+            while stack and stack[-1] != "(" and stack[-1].upper() in BOOL_OPS and prec[stack[-1].upper()] >= prec[tu]:
+                out.append(stack.pop())
+            stack.append(tu)
+        else:
+            out.append(t)
+
+    while stack:
+        out.append(stack.pop())
+    return out
 
-def term_query(term: str, fields: list[str]) -> dict:
+
+def term_query(term: str, fields: List[str]) -> Dict[str, Any]:
     t = (term or "").strip()
 
     is_phrase = t.startswith('"') and t.endswith('"') and len(t) >= 2
@@ -166,5 +348,884 @@ def term_query(term: str, fields: list[str]) -> dict:
         }
     }
 
+
+def _rpn_to_tree(rpn: List[str]) -> Optional[Tuple]:
+    """RPN -> albero n-ario: ("TERM", t) | ("NOT", nodo) | ("AND"|"OR", [nodi]), gia' appiattito."""
+    def join(op: str, a: Tuple, b: Tuple) -> Tuple:
+        children: List[Tuple] = []
+        for x in (a, b):
+            # AND(AND(a, b), c) -> AND(a, b, c)
+            children.extend(x[1] if x[0] == op else [x])
+        return (op, children)
+
+    stack: List[Tuple] = []
+    for t in rpn:
+        tu = t.upper()
+        if tu == "NOT":
+            if not stack:
+                continue
+            a = stack.pop()
+            stack.append(a[1] if a[0] == "NOT" else ("NOT", a))
+        elif tu in ("AND", "OR"):
+            if len(stack) < 2:
+                continue
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(join(tu, a, b))
+        else:
+            stack.append(("TERM", t))
+
+    if not stack:
+        return None
+    # se ci sono più termini senza operatori, comportati come AND
+    node = stack[0]
+    for extra in stack[1:]:
+        node = join("AND", node, extra)
+    return node
+
+
+def _emit(node: Tuple, fields: List[str]) -> Dict[str, Any]:
+    kind = node[0]
+    if kind == "TERM":
+        return term_query(node[1], fields)
+    if kind == "NOT":
+        return {"bool": {"must_not": [_emit(node[1], fields)]}}
+
+    # AND/OR n-ari: un solo bool per livello; i termini semplici si fondono in un
+    # unico multi_match (AND: cross_fields + operator and = ogni termine in almeno
+    # un campo; OR: best_fields + operator or = almeno un termine in un campo).
+    simple = [c[1] for c in node[1] if c[0] == "TERM" and _SIMPLE_TERM_RE.fullmatch(c[1])]
+    others = [c for c in node[1] if not (c[0] == "TERM" and _SIMPLE_TERM_RE.fullmatch(c[1]))]
+
+    clauses: List[Dict[str, Any]] = []
+    if len(simple) == 1:
+        clauses.append(term_query(simple[0], fields))
+    elif simple:
+        clauses.append({
+            "multi_match": {
+                "query": " ".join(simple),
+                "fields": fields,
+                "type": "cross_fields" if kind == "AND" else "best_fields",
+                "operator": "and" if kind == "AND" else "or",
+            }
+        })
+
+    if kind == "OR":
+        clauses.extend(_emit(c, fields) for c in others)
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"bool": {"should": clauses, "minimum_should_match": 1}}
+
+    must_not = [_emit(c[1], fields) for c in others if c[0] == "NOT"]
+    clauses.extend(_emit(c, fields) for c in others if c[0] != "NOT")
+    if len(clauses) == 1 and not must_not:
+        return clauses[0]
+    out: Dict[str, Any] = {"must": clauses or [{"match_all": {}}]}
+    if must_not:
+        out["must_not"] = must_not
+    return {"bool": out}
+
+
+def rpn_to_es_query(rpn: List[str], fields: List[str]) -> Dict[str, Any]:
+    node = _rpn_to_tree(rpn)
+    if node is None:
+        # fallback sicuro
+        return {"match_all": {}}
+    return _emit(node, fields)
+
+
+def is_boolean_query(query: str, mode: str = "auto") -> bool:
+    mode_norm = (mode or "auto").strip().lower()
+    return mode_norm == "boolean" or (mode_norm == "auto" and looks_boolean(query))
+
+
+@lru_cache(maxsize=QUERY_COMPILE_CACHE_SIZE)
+def _compile_cached(query: str, fields: Tuple[str, ...], mode: str, operator: str, fuzziness: Optional[str]) -> Dict[str, Any]:
+    if is_boolean_query(query, mode):
+        return rpn_to_es_query(to_rpn(tokenize_boolean(query)), list(fields))
+
+    mm: Dict[str, Any] = {
+        "query": query,
+        "fields": list(fields),
+        "type": "best_fields",
+        "operator": operator,
+    }
+    if fuzziness:
+        mm["fuzziness"] = fuzziness  # aiuta typo leggeri
+    return {"multi_match": mm}
+
+
+def compile_query(
+    query: str,
+    fields: List[str],
+    mode: str = "auto",
+    operator: str = "and",
+    fuzziness: Optional[str] = "AUTO",
+) -> Dict[str, Any]:
+    """
+    Query ES per la stringa utente (LRU sui compilati, si restituisce una copia):
+    - "fulltext": multi_match best_fields (operator/fuzziness)
+    - "boolean" : AND/OR/NOT, parentesi e "frasi" -> bool n-ario appiattito
+    - "auto"    : boolean se la query contiene operatori o parentesi
+    """
+    return copy.deepcopy(_compile_cached(normalize_query(query), tuple(fields), mode, operator, fuzziness))
+
+
+SORT_MODES = ("relevance", "recency")
+
+
+def build_search_body(
+    query: str,
+    fields: List[str],
+    topk: int = 20,
+    filters: Optional[SearchFilters] = None,
+    source_includes: Optional[List[str]] = None,
+    mode: str = "auto",
+    operator: str = "and",
+    fuzziness: Optional[str] = "AUTO",
+    sort: str = "relevance",
+    facets: bool = False,
+) -> Dict[str, Any]:
+    """
+    Body della ricerca (query compilata + filtri) usato sia da search_index sia da _msearch.
+    facets: aggiunge facet_aggs, calcolate sui match della query nella stessa richiesta.
+    sort="recency": piu' recenti prima, senza score ne' conteggio totale: con l'index
+    sorting su date (INDEX_SORT_BY_DATE) ES si ferma ai primi topk doc di ogni segmento.
+    """
+    body = {
+        "size": topk,
+        "query": {
+            "bool": {
+                "must": [compile_query(query, fields, mode, operator, fuzziness)],
+                "filter": _build_filters(filters),
+            }
+        },
+    }
+    if source_includes is not None:
+        body["_source"] = source_includes or False
+    if sort == "recency":
+        # stesso ordinamento dell'index sort (solo date), altrimenti niente early termination
+        body["sort"] = [{"date": {"order": "desc", "missing": "_last"}}]
+        body["track_total_hits"] = False
+    if facets:
+        body["aggs"] = facet_aggs()
+    return body
+
+
+def multi_search(
+    es: Elasticsearch,
+    requests: List[Tuple[str, Dict[str, Any]]],
+    request_timeout: float = 30,
+    use_cache: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Invia piu' ricerche (index, body) in un solo round trip _msearch.
+    Le richieste gia' in cache non vengono inviate (nessun round trip se sono tutte in cache).
+    Ritorna una risposta per richiesta, nello stesso ordine; una sotto-ricerca
+    fallita diventa una risposta vuota con la chiave "error" (e non va in cache).
+    """
+    if not requests:
+        return []
+    keys = _cache_keys(es, requests, use_cache)
+    out: List[Optional[Dict[str, Any]]] = [_RESULT_CACHE.get(k) if k else None for k in keys]
+    missing = [i for i, r in enumerate(out) if r is None]
+    if not missing:
+        return out
+
+    searches: List[Dict[str, Any]] = []
+    for i in missing:
+        index, body = requests[i]
+        searches.append({"index": index, "request_cache": True} if "aggs" in body else {"index": index})
+        searches.append(body)
+
+    res = _as_dict(es.msearch(searches=searches, request_timeout=request_timeout))
+    for i, r in zip(missing, res.get("responses", [])):
+        if "error" in r:
+            print(f"[WARN] msearch su {requests[i][0]} fallita: {r['error']}")
+            out[i] = {"hits": {"hits": []}, "error": r["error"]}
+            continue
+        out[i] = r
+        if keys[i] and not is_partial(r):
+            _RESULT_CACHE.put(keys[i], r)
+    return out
+
+
+def use_tiers(query: str, mode: str = "auto", operator: str = "and", tiered: Optional[bool] = None) -> bool:
+    """
+    Ricerca a tier (default TIERED_SEARCH) solo per le query full-text con operator "and":
+    con "or" il primo tier si riempie quasi sempre (full_text non verrebbe mai valutato) e un
+    NOT booleano va verificato su tutti i campi.
+    """
+    if not (TIERED_SEARCH if tiered is None else tiered):
+        return False
+    return operator == "and" and not is_boolean_query(query, mode)
+
+
+# campi con il subfield .raw (solo minuscole, es_setup.RAW_ANALYZER) per il term suggester
+SUGGEST_FIELDS = ("title", "caption")
+
+
+def suggest_field(fields: List[str]) -> Optional[str]:
+    """
+    Subfield .raw del primo campo di `fields` in SUGGEST_FIELDS: sul campo stemmato il
+    suggester proporrebbe radici mai scritte dall'utente ("transform" per "transformers").
+    None se nessun campo ha .raw (niente correzione per quella ricerca).
+    """
+    for f in fields:
+        base = f.partition("^")[0]
+        if base in SUGGEST_FIELDS:
+            return f"{base}.raw"
+    return None
+
+
+def suggest_body(query: str, field: str) -> Dict[str, Any]:
+    """Solo term suggester (nessun hit) su `field` (suggest_field)."""
+    return {
+        "size": 0,
+        "track_total_hits": False,
+        "suggest": {
+            "text": query,
+            "spell": {"term": {"field": field, "suggest_mode": "missing"}},
+        },
+    }
+
+
+def corrected_query(query: str, res: Dict[str, Any]) -> Optional[str]:
+    """Query con ogni termine sostituito dalla prima opzione del term suggester; None se nulla cambia."""
+    out = query
+    # a ritroso: gli offset dei termini successivi restano validi
+    for entry in sorted((res.get("suggest") or {}).get("spell") or [], key=lambda e: e["offset"], reverse=True):
+        if entry.get("options"):
+            start = entry["offset"]
+            out = out[:start] + entry["options"][0]["text"] + out[start + entry["length"]:]
+    return out if out != query else None
+
+
+def _hits(res: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return res.get("hits", {}).get("hits", [])
+
+
+def search_plan(
+    query: str,
+    targets: Dict[str, Tuple[str, List[str], Optional[List[str]]]],
+    size: int = 20,
+    filters: Optional[SearchFilters] = None,
+    mode: str = "auto",
+    operator: str = "and",
+    fuzziness: Optional[str] = "AUTO",
+    sort: str = "relevance",
+    tiered: Optional[bool] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+    facets: bool = False,
+):
+    """
+    Sequenza di ricerche di search_index / cross_search (condivisa sync, async e app):
+    generatore che fa yield di [(key, index, body)] e riceve {key: risposta}; ogni round e'
+    un solo _msearch. targets: {key: (indice, campi, source_includes)}.
+    1) tier 1 (use_tiers): tier1_fields senza fuzziness;
+    2) tutti i campi per le chiavi con meno di `size` hit;
+    3) ADAPTIVE_FUZZINESS (fuzziness richiesta, query non booleana): i round 1-2 sono esatti e
+       sotto FUZZY_MIN_HITS si prova la correzione del term suggester, poi la fuzziness.
+    budget_ms: ogni body riceve timeout (budget residuo) e terminate_after; un round parte
+    solo se resta budget, altrimenti le sue chiavi restano col risultato parziale.
+    Ritorna ({key: risposta}, info) con info = {"tiers": {key: 1|2},
+    "paths": {key: "exact"|"suggest"|"fuzzy"}, "corrected": {key: query corretta},
+    "timed_out": {key: bool}}; timed_out = risposta troncata o round saltati per budget.
+    facets: facet_aggs nei body delle ricerche di hit (nessuna richiesta in piu'):
+    info["facets"] = merge_facets delle risposte scelte, cioe' dei match della ricerca che ha
+    dato gli hit mostrati; un round successivo che li sostituisce porta con se' le sue facet.
+    """
+    boolean = is_boolean_query(query, mode)
+    adaptive = bool(ADAPTIVE_FUZZINESS and fuzziness and not boolean)
+    exact_fuzz = None if adaptive else fuzziness
+    # percorso dei round 1-2: la query booleana ignora la fuzziness
+    first_path = "fuzzy" if (exact_fuzz and not boolean) else "exact"
+    scoped = {key: scoped_index(index, filters) for key, (index, _, _) in targets.items()}
+    deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+    skipped = set()
+
+    def left_ms() -> Optional[int]:
+        return None if deadline is None else int((deadline - time.perf_counter()) * 1000)
+
+    def spent(keys) -> bool:
+        """True (e chiavi segnate come parziali) se il budget e' esaurito prima del round."""
+        if deadline is None or left_ms() > 0:
+            return False
+        skipped.update(keys)
+        return True
+
+    def budgeted(body):
+        if deadline is not None:
+            body["timeout"] = f"{max(1, left_ms())}ms"
+            body["terminate_after"] = BUDGET_TERMINATE_AFTER
+        return body
+
+    def requests(keys, fields_of, fuzz, queries=None):
+        out = []
+        for key in keys:
+            index, flt = scoped[key]
+            body = build_search_body((queries or {}).get(key, query), fields_of(targets[key][1]), size, flt,
+                                     targets[key][2], mode, operator, fuzz, sort, facets)
+            out.append((key, index, budgeted(body)))
+        return out
+
+    def all_fields(fields):
+        return fields
+
+    tiered_keys = [
+        key for key, (_, fields, _) in targets.items()
+        if 0 < len(tier1_fields(fields)) < len(fields)
+    ] if use_tiers(query, mode, operator, tiered) else []
+    others = [key for key in targets if key not in tiered_keys]
+    best = yield requests(tiered_keys, tier1_fields, None) + requests(others, all_fields, exact_fuzz)
+    tiers = {key: 1 if key in tiered_keys else 2 for key in targets}
+    paths = {key: first_path if key in others else "exact" for key in targets}
+
+    short = [key for key in tiered_keys if len(_hits(best[key])) < size]
+    if short and not spent(short):
+        best.update((yield requests(short, all_fields, exact_fuzz)))
+        tiers.update(dict.fromkeys(short, 2))
+        paths.update(dict.fromkeys(short, first_path))
+
+    corrected: Dict[str, str] = {}
+    low = [key for key in targets if len(_hits(best[key])) < FUZZY_MIN_HITS] if adaptive else []
+    spellable = {key: suggest_field(targets[key][1]) for key in low}
+    spellable = {key: field for key, field in spellable.items() if field}
+    if low and not spent(low):
+        suggestions = {}
+        if spellable:
+            suggestions = yield [
+                (key, scoped[key][0], budgeted(suggest_body(query, field))) for key, field in spellable.items()
+            ]
+        for key in spellable:
+            fixed = corrected_query(query, suggestions.get(key) or {})
+            if fixed:
+                corrected[key] = fixed
+        if corrected and not spent(list(corrected)):
+            for key, res in (yield requests(list(corrected), all_fields, None, corrected)).items():
+                if len(_hits(res)) > len(_hits(best[key])):
+                    best[key], paths[key] = res, "suggest"
+        still = [key for key in low if len(_hits(best[key])) < FUZZY_MIN_HITS]
+        if still and not spent(still):
+            for key, res in (yield requests(still, all_fields, fuzziness)).items():
+                if len(_hits(res)) > len(_hits(best[key])):
+                    best[key], paths[key] = res, "fuzzy"
+
+    corrected = {key: q for key, q in corrected.items() if paths[key] == "suggest"}
+    timed_out = {key: is_partial(best[key]) or key in skipped for key in targets}
+    info = {"tiers": tiers, "paths": paths, "corrected": corrected, "timed_out": timed_out}
+    if facets:
+        info["facets"] = merge_facets([best[key] for key in targets])
+    return best, info
+
+
+def budget_timeout(budget_ms: Optional[int], default: float = 30) -> float:
+    """request_timeout lato client: il budget piu' BUDGET_CLIENT_GRACE (il timeout ES e' best effort)."""
+    return budget_ms / 1000 + BUDGET_CLIENT_GRACE if budget_ms else default
+
+
+def run_plan(es: Elasticsearch, plan, use_cache: bool = True, budget_ms: Optional[int] = SEARCH_BUDGET_MS):
+    """
+    Esegue search_plan: un _msearch per round (una sola ricerca -> run_search, che propaga gli errori).
+    Con budget_ms un timeout del client diventa una risposta vuota con timed_out invece di un errore,
+    e la cache dei risultati non si usa (le risposte sotto budget possono essere troncate).
+    """
+    request_timeout = budget_timeout(budget_ms)
+    use_cache = use_cache and not budget_ms
+    try:
+        reqs = next(plan)
+        while True:
+            try:
+                if len(reqs) == 1:
+                    key, index, body = reqs[0]
+                    responses = {key: run_search(es, index, body, use_cache, request_timeout)}
+                else:
+                    res = multi_search(es, [(index, body) for _, index, body in reqs], request_timeout, use_cache)
+                    responses = {key: r for (key, _, _), r in zip(reqs, res)}
+            except ConnectionTimeout:
+                if not budget_ms:
+                    raise
+                responses = {key: {"hits": {"hits": []}, "timed_out": True} for key, _, _ in reqs}
+            reqs = plan.send(responses)
+    except StopIteration as stop:
+        return stop.value
+
+
+def search_index(
+    es: Elasticsearch,
+    index: str,
+    query: str,
+    fields: List[str],
+    topk: int = 20,
+    filters: Optional[SearchFilters] = None,
+    source_includes: Optional[List[str]] = None,
+    use_cache: bool = True,
+    mode: str = "auto",
+    operator: str = "and",
+    fuzziness: Optional[str] = "AUTO",
+    sort: str = "relevance",
+    tiered: Optional[bool] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+    facets: bool = False,
+) -> Dict[str, Any]:
+    """
+    Ricerca con la query compilata da compile_query (niente query_string/Lucene).
+    fields può includere boost con ^ (es: "title^3").
+    source_includes limita il _source restituito ([] = nessun _source, solo _id/_score).
+    Tier e fuzziness adattiva come search_plan: res["tier"] e res["path"] dicono quale
+    ricerca ha risposto, res["corrected_query"] la correzione usata (path "suggest").
+    budget_ms: latenza massima indicativa; res["timed_out"] se il risultato e' parziale.
+    facets: res["facets"] (merge_facets) dalle aggregazioni della stessa richiesta.
+    """
+    query = normalize_query(query)
+    if not query:
+        return {"hits": {"hits": []}}
+
+    plan = search_plan(query, {"main": (index, fields, source_includes)}, topk, filters,
+                       mode, operator, fuzziness, sort, tiered, budget_ms, facets)
+    responses, info = run_plan(es, plan, use_cache, budget_ms)
+    res = {**responses["main"], "tier": info["tiers"]["main"], "path": info["paths"]["main"],
+           "timed_out": info["timed_out"]["main"]}
+    if "main" in info["corrected"]:
+        res["corrected_query"] = info["corrected"]["main"]
+    if facets:
+        res["facets"] = info["facets"]
+    return res
+
+
+@lru_cache(maxsize=256)
+def _query_vector(query: str):
+    from src.embeddings import embed_array
+
+    vecs = embed_array([query])
+    return None if vecs is None else vecs[0]
+
+
+def hybrid_rerank(
+    hits: List[Dict[str, Any]],
+    query: str,
+    kind: str,
+    alpha: float = HYBRID_ALPHA,
+    top_n: int = HYBRID_RERANK_TOP_N,
+) -> List[Dict[str, Any]]:
+    """
+    Rerank ibrido dei candidati ES con lo store vettoriale locale (src/vector_index.py):
+    score = (1 - alpha) * bm25_normalizzato + alpha * coseno.
+    Nessun round trip extra verso ES; se embeddings/store non sono disponibili
+    gli hit tornano invariati.
+    """
+    if not hits:
+        return hits
+    try:
+        from src.vector_index import get_index
+        qvec = _query_vector(query)
+    except ImportError:
+        return hits
+    if qvec is None:
+        return hits
+
+    head, tail = hits[:top_n], hits[top_n:]
+    sims = get_index(kind).scores(qvec, [h.get("_id") for h in head])
+    if not sims:
+        return hits
+
+    mx = max((h.get("_score") or 0.0) for h in head) or 1.0
+    for h in head:
+        bm25 = float(h.get("_score") or 0.0) / mx
+        cos = sims.get(h.get("_id"))
+        h["_rerank"] = {"bm25": bm25, "cosine": cos}
+        # senza vettore il doc resta sulla sola componente lessicale
+        h["_score"] = mx * ((1 - alpha) * bm25 + alpha * (cos if cos is not None else 0.0))
+    head.sort(key=lambda h: h["_score"], reverse=True)
+    return head + tail
+
+
+def cross_targets(
+    index_papers: str = INDEX_PAPERS,
+    index_tables: str = INDEX_TABLES,
+    index_figures: str = INDEX_FIGURES,
+    source_fields: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Tuple[str, List[str], Optional[List[str]]]]:
+    """targets di search_plan per cross_search (condiviso sync/async): {kind: (indice, campi, _source)}."""
+    src_fields = LIST_SOURCE_FIELDS if source_fields is None else source_fields
+    return {
+        kind: (index, DEFAULT_FIELDS[kind], src_fields.get(kind))
+        for kind, index in (("paper", index_papers), ("table", index_tables), ("figure", index_figures))
+    }
+
+
+class CrossResults(list):
+    """Lista (kind, score, hit) di cross_search; .info descrive il percorso seguito (es. tier per tipo)."""
+
+    def __init__(self, items=(), info: Optional[Dict[str, Any]] = None):
+        super().__init__(items)
+        self.info: Dict[str, Any] = info or {}
+
+
+FUSION_STRATEGIES = ("rrf", "max_norm", "weighted_rrf", "weighted_max_norm")
+
+
+def fuse_hits(
+    hits_by_kind: Dict[str, List[Dict[str, Any]]],
+    strategy: str = CROSS_FUSION,
+    weights: Optional[Dict[str, float]] = None,
+    rrf_k: int = RRF_K,
+) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """
+    Fusione delle liste gia' scaricate, un solo passaggio + un sort (O(n log n)):
+    - rrf      : sum_i w_i / (rrf_k + rank_i)
+    - max_norm : sum_i w_i * score_i / max(score nella lista i)
+    Le varianti weighted_* usano weights (default FUSION_WEIGHTS), le altre w_i = 1.
+    Ogni hit riceve "_fusion" con rank finale, rank e contributo per lista.
+    Ritorna lista di (kind, score, hit) ordinata per score fuso.
+    """
+    base = strategy[len("weighted_"):] if strategy.startswith("weighted_") else strategy
+    if strategy not in FUSION_STRATEGIES:
+        raise ValueError(f"fusion sconosciuta: {strategy} (valori: {', '.join(FUSION_STRATEGIES)})")
+    w_by_kind = (weights or FUSION_WEIGHTS) if strategy.startswith("weighted_") else {}
+
+    fused: Dict[Tuple[str, str], List[Any]] = {}  # (_index, _id) -> [kind, score, hit]
+    for kind, hits in hits_by_kind.items():
+        w = float(w_by_kind.get(kind, 1.0))
+        mx = max((float(h.get("_score") or 0.0) for h in hits), default=0.0) or 1.0
+        for rank, h in enumerate(hits, start=1):
+            if base == "rrf":
+                contrib = w / (rrf_k + rank)
+            else:
+                contrib = w * float(h.get("_score") or 0.0) / mx
+
+            key = (h.get("_index", kind), h.get("_id"))
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = [kind, 0.0, h]
+                h["_fusion"] = {"strategy": strategy, "lists": {}}
+            entry[1] += contrib
+            entry[2]["_fusion"]["lists"][kind] = {"rank": rank, "contribution": contrib}
+
+    merged = [(kind, score, hit) for kind, score, hit in fused.values()]
+    merged.sort(key=lambda x: x[1], reverse=True)
+    for rank, (_, score, hit) in enumerate(merged, start=1):
+        hit["_fusion"]["rank"] = rank
+        hit["_fusion"]["score"] = score
+    return merged
+
+
+def merge_by_recency(hits_by_kind: Dict[str, List[Dict[str, Any]]]) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """Fonde liste gia' ordinate per data (sort="recency"): piu' recenti prima, senza data in fondo."""
+    def key(item):
+        sort_values = item[2].get("sort") or []
+        # ES restituisce la data come epoch millis; i doc senza data hanno un sentinel minimo
+        return sort_values[0] if sort_values and isinstance(sort_values[0], (int, float)) else float("-inf")
+
+    merged = [
+        (kind, float(h.get("_score") or 0.0), h)
+        for kind, hits in hits_by_kind.items()
+        for h in hits
+    ]
+    merged.sort(key=key, reverse=True)
+    return merged
+
+
+def merge_cross_hits(
+    query: str,
+    hits_by_kind: Dict[str, List[Dict[str, Any]]],
+    size_total: int = 20,
+    rerank: Optional[bool] = None,
+    fusion: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    sort: str = "relevance",
+) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """Rerank opzionale + fusione delle liste gia' scaricate (condiviso sync/async)."""
+    if sort == "recency":
+        return merge_by_recency(hits_by_kind)[:size_total]
+    if HYBRID_RERANK_ENABLED if rerank is None else rerank:
+        hits_by_kind = {kind: hybrid_rerank(hits, query, kind) for kind, hits in hits_by_kind.items()}
+
+    return fuse_hits(hits_by_kind, fusion or CROSS_FUSION, weights)[:size_total]
+
+
+def cross_search(
+    es: Elasticsearch,
+    query: str,
+    index_papers: str = INDEX_PAPERS,
+    index_tables: str = INDEX_TABLES,
+    index_figures: str = INDEX_FIGURES,
+    size_each: int = 20,
+    size_total: int = 20,
+    filters: Optional[SearchFilters] = None,
+    mode="auto",
+    rerank: Optional[bool] = None,
+    source_fields: Optional[Dict[str, List[str]]] = None,
+    fusion: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    sort: str = "relevance",
+    tiered: Optional[bool] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+    facets: bool = False,
+) -> CrossResults:
+    """
+    Cross-search:
+    - esegue 3 ricerche (papers/tables/figures) in un'unica richiesta _msearch
+    - a tier e con fuzziness adattiva (search_plan): altri _msearch solo per i tipi con pochi hit
+    - opzionale: rerank ibrido BM25 + coseno sullo store vettoriale locale
+    - fonde le liste con fuse_hits (fusion: rrf | max_norm | weighted_*, default CROSS_FUSION)
+    source_fields: _source per tipo (default LIST_SOURCE_FIELDS, payload da lista).
+    sort="recency": liste ordinate per data e fuse per data invece che per rank.
+    budget_ms: timeout/terminate_after per sotto-ricerca, risultati parziali invece di attese lunghe.
+    facets: info["facets"] con i conteggi sommati sui tre tipi, senza round trip aggiuntivi.
+    Ritorna CrossResults di (kind, score, hit) con info di search_plan (tiers, paths, corrected, timed_out);
+    hit["_fusion"] espone rank e contributi.
+    """
+    q = normalize_query(query)
+    if not q:
+        return CrossResults()
+
+    targets = cross_targets(index_papers, index_tables, index_figures, source_fields)
+    # un _msearch per round: le 3 ricerche vanno in parallelo lato ES
+    plan = search_plan(q, targets, size_each, filters, mode, sort=sort, tiered=tiered, budget_ms=budget_ms,
+                       facets=facets)
+    responses, info = run_plan(es, plan, budget_ms=budget_ms)
+    hits_by_kind = {kind: _hits(r) for kind, r in responses.items()}
+    merged = merge_cross_hits(q, hits_by_kind, size_total, rerank, fusion, weights, sort)
+    return CrossResults(merged, info=info)
+
+
+def grouped_body(
+    query: str,
+    size: int = 20,
+    filters: Optional[SearchFilters] = None,
+    mode: str = "auto",
+    fuzziness: Optional[str] = None,
+    source_fields: Optional[Dict[str, List[str]]] = None,
+    sort: str = "relevance",
+    facets: bool = False,
+) -> Dict[str, Any]:
+    """
+    Una sola ricerca su papers+tables+figures collassata su paper_id: ogni hit e' un paper,
+    inner_hits "best" (collapse di secondo livello su kind) ne da' il miglior paper/table/figure.
+    Ogni tipo usa i propri DEFAULT_FIELDS; il _source arriva solo negli inner hits.
+    """
+    src_fields = LIST_SOURCE_FIELDS if source_fields is None else source_fields
+    includes = sorted({f for kind in KIND_INDEX for f in src_fields.get(kind, [])} | {"kind"})
+    should = [
+        {"bool": {
+            "filter": [{"term": {"kind": kind}}],
+            "must": [compile_query(query, DEFAULT_FIELDS[kind], mode, "and", fuzziness)],
+        }}
+        for kind in KIND_INDEX
+    ]
+    body = {
+        "size": size,
+        "_source": False,
+        "query": {"bool": {"should": should, "minimum_should_match": 1, "filter": _build_filters(filters)}},
+        "collapse": {
+            "field": "paper_id",
+            "inner_hits": {
+                "name": "best",
+                "size": len(KIND_INDEX),
+                "collapse": {"field": "kind"},
+                "_source": includes,
+            },
+        },
+    }
+    if sort == "recency":
+        body["sort"] = [{"date": {"order": "desc", "missing": "_last"}}]
+        body["track_total_hits"] = False
+    if facets:
+        # le aggregazioni ignorano il collapse: contano i doc, non i gruppi
+        body["aggs"] = facet_aggs()
+    return body
+
+
+def fuse_groups(
+    groups: List[Dict[str, Any]],
+    strategy: str = CROSS_FUSION,
+    weights: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Riordina i gruppi con fuse_hits: per ogni tipo una lista dei gruppi ordinata per score
+    del loro hit di quel tipo (score confrontabili, stesso indice). group["score"] = score fuso.
+    """
+    by_id = {g["paper_id"]: g for g in groups}
+    lists: Dict[str, List[Dict[str, Any]]] = {}
+    for g in groups:
+        for kind, h in g["hits"].items():
+            lists.setdefault(kind, []).append({"_index": "group", "_id": g["paper_id"], "_score": h.get("_score")})
+    for hits in lists.values():
+        hits.sort(key=lambda h: float(h["_score"] or 0.0), reverse=True)
+    out = []
+    for _, score, proxy in fuse_hits(lists, strategy, weights):
+        g = by_id[proxy["_id"]]
+        g["score"] = score
+        g["_fusion"] = proxy["_fusion"]
+        out.append(g)
+    return out
+
+
+def grouped_search(
+    es: Elasticsearch,
+    query: str,
+    size: int = 20,
+    filters: Optional[SearchFilters] = None,
+    mode: str = "auto",
+    fuzziness: Optional[str] = "AUTO",
+    source_fields: Optional[Dict[str, List[str]]] = None,
+    sort: str = "relevance",
+    facets: bool = False,
+    fusion: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    budget_ms: Optional[int] = SEARCH_BUDGET_MS,
+) -> CrossResults:
+    """
+    Cross-search raggruppata per paper (collapse su paper_id, richiede il campo kind):
+    risultati distribuiti su paper diversi, al piu' un hit per tipo e per paper.
+    Gli score BM25 di papers/tables/figures non sono confrontabili: ES restituisce
+    GROUPED_CANDIDATES gruppi, che si riordinano con fuse_hits (fusion, default CROSS_FUSION)
+    sui rank per tipo del miglior hit di ogni gruppo; sort="recency" resta per data.
+    Fuzziness adattiva come search_plan: esatta, fuzzy solo sotto FUZZY_MIN_HITS gruppi.
+    budget_ms: timeout/terminate_after come search_plan, il retry fuzzy solo se resta budget.
+    Ritorna CrossResults di {"paper_id", "score", "hits": {kind: hit}}, info["paths"]["grouped"]
+    (e info["facets"] con facets); score = score fuso.
+    """
+    q = normalize_query(query)
+    if not q:
+        return CrossResults()
+
+    scoped = [scoped_index(index, filters) for index in KIND_INDEX.values()]
+    index = ",".join(i for i, _ in scoped)
+    flt = scoped[0][1]
+    candidates = size if sort == "recency" else max(size, GROUPED_CANDIDATES)
+    deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+
+    def run(fuzz) -> Optional[Dict[str, Any]]:
+        """Una ricerca raggruppata; None se il budget e' gia' esaurito."""
+        body = grouped_body(q, candidates, flt, mode, fuzz, source_fields, sort, facets)
+        if deadline is not None:
+            left = int((deadline - time.perf_counter()) * 1000)
+            if left <= 0:
+                return None
+            body["timeout"] = f"{left}ms"
+            body["terminate_after"] = BUDGET_TERMINATE_AFTER
+        try:
+            return run_search(es, index, body, not budget_ms, budget_timeout(budget_ms))
+        except ConnectionTimeout:
+            if not budget_ms:
+                raise
+            return {"hits": {"hits": []}, "timed_out": True}
+
+    adaptive = bool(ADAPTIVE_FUZZINESS and fuzziness and not is_boolean_query(q, mode))
+    res = run(None if adaptive else fuzziness) or {"hits": {"hits": []}, "timed_out": True}
+    path = "fuzzy" if (fuzziness and not adaptive and not is_boolean_query(q, mode)) else "exact"
+    skipped = False
+    if adaptive and len(_hits(res)) < FUZZY_MIN_HITS:
+        fuzzy = run(fuzziness)
+        skipped = fuzzy is None
+        if fuzzy is not None and len(_hits(fuzzy)) > len(_hits(res)):
+            res, path = fuzzy, "fuzzy"
+
+    groups = []
+    for h in _hits(res):
+        inner = (h.get("inner_hits", {}).get("best", {}).get("hits", {}) or {}).get("hits", [])
+        groups.append({
+            "paper_id": (h.get("fields", {}).get("paper_id") or [""])[0],
+            "score": float(h.get("_score") or 0.0),
+            "hits": {(ih.get("_source") or {}).get("kind", ""): ih for ih in inner},
+        })
+    if sort != "recency":
+        groups = fuse_groups(groups, fusion or CROSS_FUSION, weights)
+    groups = groups[:size]
+    info = {"paths": {"grouped": path}, "timed_out": {"grouped": is_partial(res) or skipped}}
+    if facets:
+        info["facets"] = merge_facets([res])
+    return CrossResults(groups, info=info)
+
+
+def paragraph_routing(para_doc_id: str) -> str:
+    """"<paper_doc_id>_<para_id>" -> paper_doc_id (chiave di routing di hw5_paragraphs)."""
+    return para_doc_id.rsplit("_", 1)[0]
+
+
+def fetch_paragraphs(es: Elasticsearch, para_ids: List[str]) -> Dict[str, str]:
+    """
+    Testo dei paragrafi referenziati da mention_refs/context_refs (campo "id"),
+    con un solo mget su hw5_paragraphs. Ritorna {id: text}; gli id mancanti sono omessi.
+    """
+    ids = [i for i in dict.fromkeys(para_ids) if i]
+    if not ids:
+        return {}
+    # indice fisico dalla sorgente nell'_id, routing = paper_id: ogni get va dritta allo shard del paper
+    docs = [
+        {"_index": physical_index(INDEX_PARAGRAPHS, id_source(i)), "_id": i, "routing": paragraph_routing(i)}
+        for i in ids
+    ]
+    res = es.mget(docs=docs, source_includes=["text"], request_timeout=10)
+    out: Dict[str, str] = {}
+    for d in res.get("docs", []):
+        if d.get("found"):
+            out[d["_id"]] = (d.get("_source") or {}).get("text", "")
+    return out
+
+
+def get_details(
+    es: Elasticsearch,
+    kind: str,
+    doc_id: str,
+    fields: Optional[List[str]] = None,
+    paper_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Campi pesanti di un singolo hit (default DETAIL_SOURCE_FIELDS[kind]), da chiamare
+    solo quando l'utente apre il dettaglio. Ritorna {} se il doc non esiste.
+    paper_id: routing di tables/figures quando ROUTE_OBJECTS_BY_PAPER e' attivo.
+    """
+    includes = DETAIL_SOURCE_FIELDS.get(kind, []) if fields is None else fields
+    if not doc_id or not includes:
+        return {}
+    routing = paper_id if (ROUTE_OBJECTS_BY_PAPER and kind in ("table", "figure")) else None
+    try:
+        index = physical_index(KIND_INDEX[kind], id_source(doc_id))
+        doc = es.get(index=index, id=doc_id, source_includes=includes, routing=routing, request_timeout=10)
+    except Exception:
+        return {}
+    return doc.get("_source", {}) or {}
+
+
+def resolve_paper_titles(
+    es: Elasticsearch,
+    paper_ids: List[str],
+    index: str = INDEX_PAPERS,
+) -> Dict[str, str]:
+    """
+    Titoli dei paper padre per una pagina di risultati (paper_id di tables/figures
+    = _id in hw5_papers): i mancanti in cache arrivano con un solo mget.
+    Serve solo per doc indicizzati prima della denormalizzazione di paper_title.
+    Ritorna {paper_id: titolo}, "" se il paper non esiste.
+    """
+    ids = [i for i in dict.fromkeys(paper_ids) if i]
+    out: Dict[str, str] = {}
+    missing: List[str] = []
+    for pid in ids:
+        title = _TITLE_CACHE.get(f"{index}/{pid}")
+        if title is None:
+            missing.append(pid)
+        else:
+            out[pid] = title
+    if not missing:
+        return out
+
+    try:
+        # un alias su piu' indici non accetta get: ogni id va all'indice fisico della sua sorgente
+        docs = [{"_index": physical_index(index, id_source(pid)), "_id": pid} for pid in missing]
+        res = es.mget(docs=docs, source_includes=["title"], request_timeout=10)
+    except Exception as e:
+        print(f"[WARN] mget titoli su {index} fallito: {e!r}")
+        return out
+    for d in res.get("docs", []):
+        title = ((d.get("_source") or {}).get("title") or "").strip() if d.get("found") else ""
+        out[d["_id"]] = title
+        _TITLE_CACHE.put(f"{index}/{d['_id']}", title)
+    return out
+
+
 def es_client() -> Elasticsearch:
     return Elasticsearch(ES_HOST, request_timeout=60)
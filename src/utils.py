@@ -8,7 +8,7 @@ from datetime import datetime
 from pathlib import Path
 from typing import Iterable, Dict, Any, List, Optional
 
-from .config import LOG_DIR
+from .config import LOG_DIR, SPLIT_INDICES_BY_SOURCE, INDEX_SOURCES
 
 # --- Text Cleaning ---
 WS_RE = re.compile(r"\s+")
@@ -118,6 +118,23 @@ def parse_date_to_iso(s: str | None) -> str | None:
         return m.group(1)
     return None
 
+# --- Index naming (config.SPLIT_INDICES_BY_SOURCE) ---
+def physical_index(base: str, source: Optional[str]) -> str:
+    """Indice fisico di `base` per una sorgente; senza split o senza sorgente l'alias `base`."""
+    if not SPLIT_INDICES_BY_SOURCE or not source:
+        return base
+    return f"{base}_{source if source in INDEX_SOURCES else 'unk'}"
+
+
+def physical_indices(base: str) -> List[str]:
+    """Tutti gli indici fisici dietro l'alias `base`."""
+    return [physical_index(base, s) for s in INDEX_SOURCES] if SPLIT_INDICES_BY_SOURCE else [base]
+
+
+def id_source(doc_id: str) -> str:
+    """Sorgente dal prefisso degli _id ("arxiv_2201.1234", "pmc_PMC1_T1", ...)."""
+    return doc_id.split("_", 1)[0]
+
 # --- Timing / profiling ---
 @contextmanager
 def timed(step: str, extra: Dict[str, Any] | None = None):
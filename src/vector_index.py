@@ -0,0 +1,229 @@
+"""Local brute-force vector index (NumPy), stored outside Elasticsearch.
+
+search_core.hybrid_rerank uses scores() to rescore ES candidates without an
+extra round trip; search() (exact top-k) serves offline tools such as
+src.bench.bench_vector_quantization, not the query path.
+
+One store per object type ("paper", "paragraph", "table", "figure") under
+data/vectors/:
+
+    <kind>.vec       raw row-major matrix (float32 or int8, see VECTOR_QUANTIZATION)
+    <kind>.ids.json  dims/dtype + row -> doc id (None = deleted row)
+
+The matrix is memory-mapped, so opening the index is O(1) and only the blocks
+touched by a query are paged in. Rows are L2-normalized at insert time, so the
+dot product is the cosine similarity.
+
+Writes append to <kind>.vec first and save <kind>.ids.json last: rows past
+len(ids) (an append interrupted before its ids were saved) are truncated before
+the next append, so new rows always line up with their ids.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import EMBEDDING_DIMS, VECTOR_QUANTIZATION, VECTOR_INDEX_DIR, VECTOR_BLOCK_ROWS
+from .embeddings import quantize_int8, INT8_SCALE
+
+
+class LocalVectorIndex:
+    def __init__(
+        self,
+        kind: str,
+        root: Path = VECTOR_INDEX_DIR,
+        dims: int = EMBEDDING_DIMS,
+        quantization: str = VECTOR_QUANTIZATION,
+    ):
+        self.kind = kind
+        self.root = Path(root)
+        self.vec_path = self.root / f"{kind}.vec"
+        self.meta_path = self.root / f"{kind}.ids.json"
+        self.dims = dims
+        self.dtype = np.int8 if quantization == "int8" else np.float32
+        self.ids: List[Optional[str]] = []
+        self._mm = None
+        self._dead = None
+
+        if self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            self.dims = int(meta["dims"])
+            self.dtype = np.dtype(meta["dtype"]).type
+            self.ids = meta["ids"]
+        self._row_of: Dict[str, int] = {d: i for i, d in enumerate(self.ids) if d is not None}
+
+    # ------------------------------------------------------------------
+    # storage
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._row_of
+
+    def dead_ratio(self) -> float:
+        """Share of tombstoned rows (upsert of an existing id leaves one behind)."""
+        return 1 - len(self._row_of) / len(self.ids) if self.ids else 0.0
+
+    def _matrix(self):
+        if self._mm is None and self.ids:
+            self._mm = np.memmap(self.vec_path, dtype=self.dtype, mode="r", shape=(len(self.ids), self.dims))
+        return self._mm
+
+    def _dead_rows(self) -> np.ndarray:
+        if self._dead is None:
+            self._dead = np.array([d is None for d in self.ids], dtype=bool)
+        return self._dead
+
+    def _truncate_orphans(self):
+        """Drop rows beyond len(ids), left by an append whose ids.json was never written."""
+        expected = len(self.ids) * self.dims * np.dtype(self.dtype).itemsize
+        if self.vec_path.exists() and self.vec_path.stat().st_size > expected:
+            with self.vec_path.open("r+b") as f:
+                f.truncate(expected)
+
+    def _save_meta(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "dims": self.dims,
+            "dtype": np.dtype(self.dtype).name,
+            "ids": self.ids,
+        }), encoding="utf-8")
+        tmp.replace(self.meta_path)
+
+    def _encode(self, vecs) -> np.ndarray:
+        arr = np.asarray(vecs, dtype=np.float32).reshape(-1, self.dims)
+        norms = np.linalg.norm(arr, axis=1, keepdims=True)
+        arr = arr / np.where(norms == 0, 1.0, norms)
+        if self.dtype is np.int8:
+            return quantize_int8(arr)
+        return arr.astype(np.float32)
+
+    def upsert(self, ids: Sequence[str], vecs) -> None:
+        """Append vectors; ids already present are replaced (old row tombstoned)."""
+        if not len(ids):
+            return
+        self.delete(ids, save=False)
+        rows = self._encode(vecs)
+        if rows.shape[0] != len(ids):
+            raise ValueError(f"{len(ids)} ids but {rows.shape[0]} vectors")
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._mm = None
+        self._truncate_orphans()
+        with self.vec_path.open("ab") as f:
+            f.write(np.ascontiguousarray(rows).tobytes())
+
+        base = len(self.ids)
+        for j, doc_id in enumerate(ids):
+            self.ids.append(doc_id)
+            self._row_of[doc_id] = base + j
+        self._mm = None
+        self._dead = None
+        self._save_meta()
+
+    def delete(self, ids: Iterable[str], save: bool = True) -> int:
+        n = 0
+        for doc_id in ids:
+            row = self._row_of.pop(doc_id, None)
+            if row is not None:
+                self.ids[row] = None
+                n += 1
+        if n:
+            self._dead = None
+        if n and save:
+            self._save_meta()
+        return n
+
+    def compact(self) -> None:
+        """Rewrite the matrix without deleted rows."""
+        mm = self._matrix()
+        live = [i for i, d in enumerate(self.ids) if d is not None]
+        if mm is None or len(live) == len(self.ids):
+            return
+        tmp = self.vec_path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            for start in range(0, len(live), VECTOR_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(mm[live[start:start + VECTOR_BLOCK_ROWS]]).tobytes())
+        self._mm = None
+        self._dead = None
+        tmp.replace(self.vec_path)
+        self.ids = [self.ids[i] for i in live]
+        self._row_of = {d: i for i, d in enumerate(self.ids)}
+        self._save_meta()
+
+    # ------------------------------------------------------------------
+    # query
+    # ------------------------------------------------------------------
+    def _query_vec(self, qvec) -> np.ndarray:
+        q = np.asarray(qvec, dtype=np.float32).reshape(-1)
+        n = np.linalg.norm(q)
+        return q / n if n else q
+
+    def _block_scores(self, block) -> np.ndarray:
+        return block.astype(np.float32, copy=False)
+
+    def search(self, qvec, k: int = 10, block_rows: int = VECTOR_BLOCK_ROWS) -> List[Tuple[str, float]]:
+        """Exact top-k by cosine: blocked mat-vec + argpartition, O(n) per query."""
+        mm = self._matrix()
+        if mm is None or k <= 0:
+            return []
+        q = self._query_vec(qvec)
+        scale = INT8_SCALE if self.dtype is np.int8 else 1.0
+
+        dead = self._dead_rows()
+        cand_rows: List[np.ndarray] = []
+        cand_scores: List[np.ndarray] = []
+        for start in range(0, mm.shape[0], block_rows):
+            scores = self._block_scores(mm[start:start + block_rows]) @ q
+            scores[dead[start:start + scores.shape[0]]] = -np.inf
+            kk = min(k, scores.shape[0])
+            idx = np.argpartition(-scores, kk - 1)[:kk]
+            cand_rows.append(idx + start)
+            cand_scores.append(scores[idx])
+
+        rows = np.concatenate(cand_rows)
+        scores = np.concatenate(cand_scores)
+        kk = min(k, scores.shape[0])
+        top = np.argpartition(-scores, kk - 1)[:kk]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i] / scale)) for i in top if np.isfinite(scores[i])]
+
+    def scores(self, qvec, ids: Iterable[str]) -> Dict[str, float]:
+        """Cosine between qvec and the given ids (missing ids are skipped)."""
+        mm = self._matrix()
+        if mm is None:
+            return {}
+        pairs = [(d, self._row_of[d]) for d in ids if d in self._row_of]
+        if not pairs:
+            return {}
+        q = self._query_vec(qvec)
+        scale = INT8_SCALE if self.dtype is np.int8 else 1.0
+        rows = np.array([r for _, r in pairs])
+        sims = self._block_scores(mm[rows]) @ q / scale
+        return {d: float(s) for (d, _), s in zip(pairs, sims)}
+
+
+_OPEN: Dict[str, Tuple[int, LocalVectorIndex]] = {}
+
+
+def _meta_mtime(kind: str) -> int:
+    path = VECTOR_INDEX_DIR / f"{kind}.ids.json"
+    return path.stat().st_mtime_ns if path.exists() else 0
+
+
+def get_index(kind: str) -> LocalVectorIndex:
+    """
+    Shared per-process instance (read path). Every write rewrites <kind>.ids.json, so the
+    store is reopened when its mtime changes (e.g. after index_all in another process).
+    """
+    mtime = _meta_mtime(kind)
+    item = _OPEN.get(kind)
+    if item is None or item[0] != mtime:
+        item = _OPEN[kind] = (mtime, LocalVectorIndex(kind))
+    return item[1]